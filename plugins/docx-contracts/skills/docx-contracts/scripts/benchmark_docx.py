@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Benchmark template filling on generated contracts.
+
+Builds templates of several sizes with python-docx (header, clause sections
+with placeholders and conditions, a row-loop table) plus matching records,
+then measures:
+    - import and CLI startup time
+    - extract_schema cold (no cache) and warm latency
+    - single-record latency of fill_template vs CompiledTemplate
+    - batch CLI throughput and peak RSS, with the --timings breakdown
+
+Usage:
+    benchmark_docx.py [--sizes small,medium,large] [--repeat 20]
+                      [--batch-records 200] [--workers N] [--json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from docx import Document
+
+SCRIPTS = Path(__file__).resolve().parent
+
+# Number of clause sections per template.
+TEMPLATE_SIZES = {"small": 5, "medium": 50, "large": 400}
+
+CITIES = ["Moscow", "Kazan", "Perm", "Omsk", "Tver", "Sochi"]
+GOODS = ["Cable", "Switch", "Router", "Server", "Rack", "Battery", "Panel"]
+
+
+def make_template(path, sections):
+    doc = Document()
+    doc.core_properties.title = "Contract {{ number }}"
+    doc.sections[0].header.paragraphs[0].text = "Contract {{ number }} / {{ buyer.name }}"
+    doc.add_heading("Supply contract No. {{ number }}", level=1)
+    doc.add_paragraph("{{ city }}, {{ date }}")
+    doc.add_paragraph(
+        "{{ seller.name }}, represented by {{ seller.director }}, and {{ buyer.name }}, "
+        "represented by {{ buyer.director }}, have agreed as follows."
+    )
+    for i in range(1, sections + 1):
+        doc.add_heading(f"{i}. Clause {i}", level=2)
+        doc.add_paragraph(
+            f"{i}.1. The Seller delivers the goods to {{{{ buyer.address.city }}}} within "
+            "{{ terms.delivery_days }} days. Payment of {{ terms.amount }} {{ terms.currency }} "
+            "is due within {{ terms.payment_days }} days of delivery."
+        )
+        doc.add_paragraph(
+            f"{i}.2. {{% if terms.prepayment %}}Prepayment of {{{{ terms.prepayment }}}}% is "
+            "required.{% else %}No prepayment is required.{% endif %} Penalty: "
+            "{{ terms.penalty|default('0.1') }}% per day."
+        )
+    table = doc.add_table(rows=3, cols=4)
+    for cell, text in zip(table.rows[0].cells, ["No.", "Item", "Qty", "Price"]):
+        cell.text = text
+    table.cell(1, 0).text = "{%tr for item in items %}"
+    row = table.rows[2].cells
+    row[0].text = "{{ loop.index }}"
+    row[1].text = "{{ item.name }}"
+    row[2].text = "{{ item.qty }}"
+    row[3].text = "{{ item.price }}"
+    table.add_row().cells[0].text = "{%tr endfor %}"
+    doc.add_paragraph("Signed: {{ signers|join(', ') }}")
+    doc.save(path)
+
+
+def make_record(index, rng):
+    return {
+        "number": f"2025-{index:05d}",
+        "city": rng.choice(CITIES),
+        "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "seller": {"name": "Supplier LLC", "director": "I. Petrov"},
+        "buyer": {
+            "name": f"Buyer {index} JSC",
+            "director": f"Director {index}",
+            "address": {"city": rng.choice(CITIES)},
+        },
+        "terms": {
+            "delivery_days": rng.randint(5, 60),
+            "amount": rng.randint(10_000, 5_000_000),
+            "currency": "RUB",
+            "payment_days": rng.choice([10, 30, 45]),
+            "prepayment": rng.choice([0, 30, 50]),
+        },
+        "items": [
+            {"name": rng.choice(GOODS), "qty": rng.randint(1, 100), "price": rng.randint(100, 90_000)}
+            for _ in range(rng.randint(1, 15))
+        ],
+        "signers": ["I. Petrov", f"Director {index}"],
+    }
+
+
+def percentiles(values):
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p90_ms": round(pick(0.90) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+def run_child(command, cwd=None):
+    """Run a process; peak RSS comes from os.wait4, i.e. for that process only."""
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, stdout=out, stderr=err, cwd=cwd)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        err.seek(0)
+        rss = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+        return {
+            "seconds": elapsed,
+            "returncode": os.waitstatus_to_exitcode(status),
+            "peak_rss_mb": round(rss, 1),
+            "stderr": err.read().decode("utf-8", errors="replace"),
+        }
+
+
+def measure_startup(repeat):
+    def median(command):
+        runs = [run_child(command, cwd=SCRIPTS) for _ in range(repeat)]
+        return round(sorted(r["seconds"] for r in runs)[len(runs) // 2] * 1000, 1)
+
+    return {
+        "python_ms": median([sys.executable, "-c", "pass"]),
+        "import_ms": median([sys.executable, "-c", "import fill_template"]),
+        "cli_help_ms": median([sys.executable, str(SCRIPTS / "fill_template.py"), "--help"]),
+    }
+
+
+def measure_schema(template, repeat):
+    from extract_schema import extract_schema
+
+    cold, warm = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract_schema(template, use_cache=False)
+        cold.append(time.perf_counter() - started)
+    extract_schema(template)
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract_schema(template)
+        warm.append(time.perf_counter() - started)
+    return {"cold": percentiles(cold), "warm": percentiles(warm)}
+
+
+def measure_single(template, records, workdir):
+    from fill_template import CompiledTemplate, fill_template
+    from timings import PhaseTimer
+
+    output = os.path.join(workdir, "single.docx")
+    plain, compiled = [], []
+    plain_timings, compiled_timings = PhaseTimer(), PhaseTimer()
+    for record in records:
+        started = time.perf_counter()
+        fill_template(template, record, output, plain_timings)
+        plain.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tpl = CompiledTemplate(template)
+    compile_ms = round((time.perf_counter() - started) * 1000, 2)
+    for record in records:
+        started = time.perf_counter()
+        tpl.save(record, output, compiled_timings)
+        compiled.append(time.perf_counter() - started)
+    return {
+        "fill_template": {**percentiles(plain), "timings": plain_timings.report()["phases"]},
+        "compiled": {**percentiles(compiled), "compile_ms": compile_ms,
+                     "timings": compiled_timings.report()["phases"]},
+    }
+
+
+def measure_batch(template, records_path, count, workers, workdir):
+    output_dir = os.path.join(workdir, "batch")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    command = [sys.executable, str(SCRIPTS / "fill_template.py"), "--batch",
+               template, records_path, output_dir, "--timings"]
+    if workers:
+        command += ["--workers", str(workers)]
+    run = run_child(command)
+    if run["returncode"] != 0:
+        raise RuntimeError(run["stderr"])
+    timings = None
+    for line in run["stderr"].splitlines():
+        if line.startswith('{"timings"'):
+            timings = json.loads(line)["timings"]["phases"]
+    return {
+        "records": count,
+        "seconds": round(run["seconds"], 3),
+        "docs_per_sec": round(count / run["seconds"], 1),
+        # The child's own peak; worker processes are not included.
+        "peak_rss_mb": run["peak_rss_mb"],
+        "timings": timings,
+    }
+
+
+def print_report(report):
+    startup = report["startup"]
+    print(f"startup: python {startup['python_ms']} ms, import fill_template {startup['import_ms']} ms, "
+          f"cli --help {startup['cli_help_ms']} ms")
+    print()
+    header = (f"{'size':<8} {'KB':>6} {'schema cold':>12} {'warm':>7} {'docxtpl p50':>12} "
+              f"{'compiled p50':>13} {'p99':>7} {'docs/s':>8} {'peak MB':>8}")
+    print(header)
+    print("-" * len(header))
+    for size, row in report["sizes"].items():
+        single = row["single"]
+        print(f"{size:<8} {row['template_kb']:>6} {row['schema']['cold']['p50_ms']:>12.2f} "
+              f"{row['schema']['warm']['p50_ms']:>7.2f} {single['fill_template']['p50_ms']:>12.2f} "
+              f"{single['compiled']['p50_ms']:>13.2f} {single['compiled']['p99_ms']:>7.2f} "
+              f"{row['batch']['docs_per_sec']:>8.1f} {row['batch']['peak_rss_mb']:>8.1f}")
+    print()
+    for size, row in report["sizes"].items():
+        phases = ", ".join(f"{name} {p['ms']:.0f} ms" for name, p in (row["batch"]["timings"] or {}).items())
+        print(f"{size} batch: {phases}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark docx template filling on generated contracts")
+    parser.add_argument("--sizes", default=",".join(TEMPLATE_SIZES),
+                        help=f"comma-separated template sizes: {', '.join(TEMPLATE_SIZES)}")
+    parser.add_argument("--repeat", type=int, default=20, help="single-record renders per size (default: 20)")
+    parser.add_argument("--batch-records", type=int, default=200, help="records per batch run (default: 200)")
+    parser.add_argument("--workers", type=int, default=None, help="batch worker processes (default: CPU count)")
+    parser.add_argument("--startup-repeat", type=int, default=5, help="startup measurements (default: 5)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    sizes = [name.strip() for name in args.sizes.split(",") if name.strip()]
+    for name in sizes:
+        if name not in TEMPLATE_SIZES:
+            parser.error(f"unknown size {name}; available: {', '.join(TEMPLATE_SIZES)}")
+
+    sys.path.insert(0, str(SCRIPTS))
+    rng = random.Random(0)
+    workdir = tempfile.mkdtemp(prefix="benchmark_docx_")
+    try:
+        records = [make_record(i, rng) for i in range(max(args.repeat, args.batch_records))]
+        records_path = os.path.join(workdir, "records.jsonl")
+        with open(records_path, "w", encoding="utf-8") as f:
+            for record in records[:args.batch_records]:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        report = {"startup": measure_startup(args.startup_repeat), "sizes": {}}
+        for size in sizes:
+            template = os.path.join(workdir, f"{size}.docx")
+            make_template(template, TEMPLATE_SIZES[size])
+            report["sizes"][size] = {
+                "template_kb": os.path.getsize(template) // 1024,
+                "schema": measure_schema(template, max(3, args.repeat // 4)),
+                "single": measure_single(template, records[:args.repeat], workdir),
+                "batch": measure_batch(template, records_path, args.batch_records, args.workers, workdir),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,439 @@
 #!/usr/bin/env python3
-"""Extract template variables from a docx template and generate JSON schema."""
+"""Extract template variables from a docx template and generate JSON schema.
+
+The schema is inferred from the Jinja AST of the body, headers, footers,
+footnotes and templated core properties:
+- `{{ party.name }}` makes `party` an object with a `name` property
+- `{% for item in items %}{{ item.price }}` makes `items` an array of objects
+- values that are only tested (`{% if vip %}`), only used inside a
+  conditional branch (`{% if vip %}{{ discount }}{% endif %}`, `a if c else b`,
+  `for ... else`, right side of `and`/`or`), or have a `default` filter or
+  `is defined` test are optional
+
+Results are cached in `cache/schemas/` by the SHA-256 of the template file.
+--timings prints a per-phase breakdown (hash, cache, load, parse, infer) as
+JSON to stderr.
+"""
+import os
 import sys
 import json
-from docxtpl import DocxTemplate
+import hashlib
+from pathlib import Path
+from contextlib import contextmanager
+
+from jinja2 import Environment, nodes
+
+from timings import PhaseTimer, phase
+
+SCHEMA_VERSION = 2
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "cache" / "schemas"
+
+# Core properties docxtpl renders as Jinja templates (see DocxTemplate.render_properties)
+TEMPLATED_PROPERTIES = ("author", "comments", "identifier", "language", "subject", "title")
+
+# Filters that take a sequence and return a sequence of the same items
+SEQUENCE_FILTERS = {"sort", "reverse", "list", "unique", "select", "reject",
+                    "selectattr", "rejectattr", "batch", "slice"}
+
+# Filters that only make sense on a sequence
+AGGREGATE_FILTERS = {"length", "count", "first", "last", "join", "sum", "min", "max",
+                     "map", "groupby"}
+
+_memory_cache = {}
+
+
+class _Field:
+    """Inferred shape of one value: any, boolean, string, object or array."""
+
+    RANK = {"any": 0, "boolean": 1, "string": 2, "object": 3, "array": 3}
+
+    def __init__(self):
+        self.kind = "any"
+        self.optional = False
+        self.needed = False
+        self.open = False
+        self.properties = {}
+        self.items = None
+
+    def use(self, kind):
+        if self.RANK[kind] > self.RANK[self.kind]:
+            self.kind = kind
+
+    def prop(self, name):
+        self.use("object")
+        if name not in self.properties:
+            self.properties[name] = _Field()
+        return self.properties[name]
+
+    def item(self):
+        self.use("array")
+        if self.items is None:
+            self.items = _Field()
+        return self.items
+
+    @property
+    def required(self):
+        return self.needed and not self.optional and self.kind != "boolean"
+
+    def to_schema(self):
+        if self.kind == "object":
+            schema = {
+                "type": "object",
+                "properties": {name: f.to_schema() for name, f in self.properties.items()},
+                "required": [name for name, f in self.properties.items() if f.required],
+            }
+            if self.open:
+                schema["additionalProperties"] = True
+            return schema
+        if self.kind == "array":
+            return {"type": "array", "items": self.items.to_schema() if self.items else {}}
+        if self.kind == "any":
+            return {}
+        return {"type": self.kind}
+
+
+class _SchemaBuilder:
+    """Walks Jinja ASTs and collects the fields the templates read from the context.
+
+    Scopes map local names (loop targets, `set`, macro arguments) to the field
+    they alias, or to None when the value is not part of the context.
+
+    A field is needed (and so required, unless optional for another reason)
+    only if some use of it is always evaluated. Uses inside `if`/`elif`/`else`
+    bodies, conditional expressions, `for ... else` and the right side of
+    `and`/`or` are guarded and do not make a field required.
+    """
+
+    def __init__(self, env):
+        self.globals = set(env.globals)
+        self.root = _Field()
+        self.root.kind = "object"
+        self.guarded = 0
+
+    @contextmanager
+    def _guard(self):
+        self.guarded += 1
+        try:
+            yield
+        finally:
+            self.guarded -= 1
+
+    def _reach(self, field, reach=True):
+        if reach and not self.guarded:
+            field.needed = True
+        return field
+
+    def add(self, ast):
+        self._body(ast.body, {})
+
+    # statements
+
+    def _body(self, body, scope):
+        for node in body:
+            self._stmt(node, scope)
+
+    def _stmt(self, node, scope):
+        if isinstance(node, nodes.Output):
+            for child in node.nodes:
+                if not isinstance(child, nodes.TemplateData):
+                    self._expr(child, scope, "string")
+        elif isinstance(node, nodes.For):
+            field = self._expr(node.iter, scope, "array")
+            inner = dict(scope, loop=None)
+            item = field.item() if field is not None else None
+            for name in self._targets(node.target):
+                inner[name] = item if isinstance(node.target, nodes.Name) else None
+            if node.test is not None:
+                self._expr(node.test, inner, "boolean")
+            self._body(node.body, inner)
+            with self._guard():
+                self._body(node.else_, scope)
+        elif isinstance(node, nodes.If):
+            self._expr(node.test, scope, "boolean")
+            with self._guard():
+                self._body(node.body, scope)
+                for branch in node.elif_:
+                    self._stmt(branch, scope)
+                self._body(node.else_, scope)
+        elif isinstance(node, nodes.Assign):
+            field = self._expr(node.node, scope, "any")
+            for name in self._targets(node.target):
+                scope[name] = field if isinstance(node.target, nodes.Name) else None
+        elif isinstance(node, nodes.AssignBlock):
+            self._body(node.body, scope)
+            for name in self._targets(node.target):
+                scope[name] = None
+        elif isinstance(node, nodes.With):
+            inner = dict(scope)
+            for target, value in zip(node.targets, node.values):
+                field = self._expr(value, scope, "any")
+                for name in self._targets(target):
+                    inner[name] = field if isinstance(target, nodes.Name) else None
+            self._body(node.body, inner)
+        elif isinstance(node, (nodes.Macro, nodes.CallBlock)):
+            if isinstance(node, nodes.Macro):
+                scope[node.name] = None
+            else:
+                self._expr(node.call, scope, "any")
+            inner = dict(scope, caller=None, varargs=None, kwargs=None)
+            for default in node.defaults:
+                self._expr(default, scope, "any")
+            for arg in node.args:
+                inner[arg.name] = None
+            self._body(node.body, inner)
+        else:
+            for child in node.iter_child_nodes():
+                if isinstance(child, nodes.Expr):
+                    self._expr(child, scope, "any")
+                else:
+                    self._stmt(child, scope)
+
+    @staticmethod
+    def _targets(target):
+        if isinstance(target, nodes.Name):
+            return [target.name]
+        return [n.name for n in target.find_all(nodes.Name)]
+
+    # expressions
+
+    def _resolve(self, node, scope, reach=True):
+        """Field a Name/Getattr/Getitem chain refers to, or None if it is not context data.
+
+        With reach=False the last link is not marked needed (a bare truth test
+        does not need the value to exist); the links before it always are.
+        """
+        if isinstance(node, nodes.Name):
+            if node.name in scope:
+                return scope[node.name]
+            if node.name in self.globals:
+                return None
+            return self._reach(self.root.prop(node.name), reach)
+        if isinstance(node, nodes.Getattr):
+            base = self._resolve(node.node, scope)
+            return self._reach(base.prop(node.attr), reach) if base is not None else None
+        if isinstance(node, nodes.Getitem):
+            base = self._resolve(node.node, scope)
+            arg = node.arg
+            if isinstance(arg, nodes.Const) and isinstance(arg.value, str):
+                return self._reach(base.prop(arg.value), reach) if base is not None else None
+            if isinstance(arg, nodes.Const) and isinstance(arg.value, int):
+                return base.item() if base is not None else None
+            self._expr(arg, scope, "string")
+            if base is not None:
+                base.use("object")
+                base.open = True
+            return None
+        return self._expr(node, scope, "any")
+
+    def _expr(self, node, scope, kind):
+        """Record how an expression uses context data; returns the field it evaluates to."""
+        if isinstance(node, (nodes.Name, nodes.Getattr, nodes.Getitem)):
+            field = self._resolve(node, scope, reach=kind != "boolean")
+            if field is not None:
+                field.use(kind)
+            return field
+
+        if isinstance(node, nodes.Filter) and node.node is not None:
+            for arg in node.args + [kw.value for kw in node.kwargs]:
+                self._expr(arg, scope, "any")
+            if node.name in ("default", "d"):
+                field = self._expr(node.node, scope, kind)
+                if field is not None:
+                    field.optional = True
+                return field
+            if node.name in SEQUENCE_FILTERS:
+                return self._expr(node.node, scope, "array")
+            if node.name in AGGREGATE_FILTERS:
+                field = self._expr(node.node, scope, "array")
+                if node.name == "join" and field is not None:
+                    field.item().use("string")
+                return None
+            self._expr(node.node, scope, kind)
+            return None
+
+        if isinstance(node, nodes.Test):
+            for arg in node.args:
+                self._expr(arg, scope, "any")
+            if node.name in ("defined", "undefined", "none"):
+                field = self._resolve(node.node, scope, reach=False)
+                if field is not None:
+                    field.optional = True
+                return None
+            self._expr(node.node, scope, "any")
+            return None
+
+        if isinstance(node, nodes.Call):
+            func = node.node
+            if isinstance(func, nodes.Getattr) and func.attr in ("items", "keys", "values"):
+                field = self._resolve(func.node, scope)
+                if field is not None:
+                    field.use("object")
+                    field.open = True
+            elif isinstance(func, nodes.Getattr):
+                self._expr(func.node, scope, "any")
+            else:
+                self._expr(func, scope, "any")
+            for arg in node.args + [kw.value for kw in node.kwargs]:
+                self._expr(arg, scope, "any")
+            return None
+
+        if isinstance(node, nodes.CondExpr):
+            self._expr(node.test, scope, "boolean")
+            with self._guard():
+                self._expr(node.expr1, scope, kind)
+                if node.expr2 is not None:
+                    self._expr(node.expr2, scope, kind)
+            return None
+
+        if isinstance(node, (nodes.And, nodes.Or)):
+            operand = kind if kind == "boolean" else "any"
+            self._expr(node.left, scope, operand)
+            with self._guard():
+                self._expr(node.right, scope, operand)
+            return None
+
+        if isinstance(node, nodes.Not):
+            self._expr(node.node, scope, kind if kind == "boolean" else "any")
+            return None
+
+        if isinstance(node, nodes.Compare):
+            self._expr(node.expr, scope, "string")
+            for operand in node.ops:
+                if operand.op in ("in", "notin"):
+                    self._expr(operand.expr, scope, "any")
+                else:
+                    self._expr(operand.expr, scope, "string")
+            return None
+
+        if isinstance(node, (nodes.BinExpr, nodes.UnaryExpr, nodes.Concat)):
+            for child in node.iter_child_nodes():
+                self._expr(child, scope, "string")
+            return None
+
+        for child in node.iter_child_nodes():
+            if isinstance(child, nodes.Expr):
+                self._expr(child, scope, "any")
+        return None
+
+
+def template_sources(template_path):
+    """Patched Jinja sources of every part docxtpl renders."""
+    # imported here so that a cache hit does not pay for loading python-docx
+    from docxtpl import DocxTemplate
+    from docx.opc.constants import CONTENT_TYPE as CT
 
-def extract_schema(template_path):
-    """Extract variables and return JSON schema."""
     doc = DocxTemplate(template_path)
-    variables = doc.get_undeclared_template_variables()
-    
-    schema = {
-        "type": "object",
-        "properties": {var: {"type": "string"} for var in variables},
-        "required": list(variables)
-    }
-    
+    doc.init_docx()
+    docx = doc.docx
+
+    sources = [doc.patch_xml(doc.get_xml())]
+    for uri in (doc.HEADER_URI, doc.FOOTER_URI):
+        for _, part in doc.get_headers_footers(uri):
+            sources.append(doc.patch_xml(doc.get_part_xml(part)))
+    for part in docx.part.package.parts:
+        if part.content_type == CT.WML_FOOTNOTES:
+            blob = part.blob.decode("utf-8") if isinstance(part.blob, bytes) else part.blob
+            sources.append(doc.patch_xml(blob))
+    for prop in TEMPLATED_PROPERTIES:
+        value = getattr(docx.core_properties, prop)
+        if "{" in value:
+            sources.append(value)
+    return sources
+
+
+def build_schema(template_path, timings=None):
+    """Parse every part once and infer the nested schema (no caching)."""
+    with phase(timings, "load"):
+        sources = template_sources(template_path)
+    env = Environment()
+    builder = _SchemaBuilder(env)
+    for source in sources:
+        with phase(timings, "parse"):
+            ast = env.parse(source)
+        with phase(timings, "infer"):
+            builder.add(ast)
+    with phase(timings, "infer"):
+        schema = builder.root.to_schema()
     return {
-        "variables": list(variables),
+        "variables": list(schema["properties"]),
         "schema": schema
     }
 
+
+def extract_schema(template_path, use_cache=True, timings=None):
+    """Extract variables and return JSON schema, cached by template content hash."""
+    if not use_cache:
+        return build_schema(template_path, timings)
+
+    with phase(timings, "hash"):
+        with open(template_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+    if digest in _memory_cache:
+        return _memory_cache[digest]
+
+    cache_file = CACHE_DIR / f"{digest}.json"
+    try:
+        with phase(timings, "cache"):
+            cached = json.loads(cache_file.read_text(encoding="utf-8"))
+        if cached.get("version") == SCHEMA_VERSION:
+            result = {"variables": cached["variables"], "schema": cached["schema"]}
+            _memory_cache[digest] = result
+            return result
+    except (OSError, ValueError, KeyError):
+        pass
+
+    result = build_schema(template_path, timings)
+    _memory_cache[digest] = result
+    try:
+        with phase(timings, "cache"):
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({"version": SCHEMA_VERSION, **result}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, cache_file)
+    except OSError:
+        pass
+    return result
+
+
+def validate(schema, data, path="$"):
+    """Check data against an extracted schema; returns a list of error messages.
+
+    Structure is strict (objects, arrays, required fields). Scalar types are
+    hints: any non-null scalar is accepted where the template prints a value.
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(data, dict):
+            return [f"{path}: expected object, got {type(data).__name__}"]
+        errors = [f"{path}.{name}: required field is missing"
+                  for name in schema.get("required", []) if name not in data]
+        for name, sub in schema.get("properties", {}).items():
+            if name in data:
+                errors.extend(validate(sub, data[name], f"{path}.{name}"))
+        return errors
+    if kind == "array":
+        if not isinstance(data, list):
+            return [f"{path}: expected array, got {type(data).__name__}"]
+        errors = []
+        for i, item in enumerate(data):
+            errors.extend(validate(schema.get("items", {}), item, f"{path}[{i}]"))
+        return errors
+    if kind == "string" and (data is None or isinstance(data, (dict, list))):
+        return [f"{path}: expected a value, got {'null' if data is None else type(data).__name__}"]
+    return []
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python extract_schema.py <template.docx>")
+    flags = {"--no-cache", "--timings"}
+    args = [a for a in sys.argv[1:] if a not in flags]
+    if len(args) != 1:
+        print("Usage: python extract_schema.py <template.docx> [--no-cache] [--timings]")
         sys.exit(1)
-    
-    result = extract_schema(sys.argv[1])
+
+    timings = PhaseTimer() if "--timings" in sys.argv else None
+    result = extract_schema(args[0], use_cache="--no-cache" not in sys.argv, timings=timings)
     print(json.dumps(result, indent=2, ensure_ascii=False))
+    if timings is not None:
+        print(json.dumps({"timings": timings.report()}), file=sys.stderr)
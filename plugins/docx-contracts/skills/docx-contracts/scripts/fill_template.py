@@ -1,24 +1,367 @@
 #!/usr/bin/env python3
-"""Fill docx template with provided data."""
+"""Fill docx template with provided data.
+
+Single document:
+    fill_template.py <template.docx> <data.json> <output.docx>
+
+Batch (one template, many records from .csv / .jsonl / .json):
+    fill_template.py --batch <template.docx> <records> <output_dir>
+                     [--pattern "{index:04d}.docx"] [--workers N] [--report report.json]
+
+--timings prints a per-phase breakdown (load, validate, render, save) as
+JSON to stderr.
+"""
+import io
+import os
+import re
 import sys
+import csv
 import json
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 from docxtpl import DocxTemplate
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.oxml import parse_xml, serialize_part_xml
+from jinja2 import Environment
+
+from extract_schema import TEMPLATED_PROPERTIES, extract_schema, validate
+from timings import PhaseTimer, phase
+
+DEFAULT_PATTERN = "{index:04d}.docx"
+
+# Characters that cannot appear in a file name on common file systems
+UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
 
-def fill_template(template_path, data_json, output_path):
+def fill_template(template_path, data_json, output_path, timings=None):
     """Fill template with data and save result."""
-    doc = DocxTemplate(template_path)
+    with phase(timings, "load"):
+        doc = DocxTemplate(template_path)
+        doc.init_docx()
     data = json.loads(data_json) if isinstance(data_json, str) else data_json
-    doc.render(data)
-    doc.save(output_path)
+    with phase(timings, "render"):
+        doc.render(data)
+    with phase(timings, "save"):
+        doc.save(output_path)
     return output_path
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python fill_template.py <template.docx> <data.json> <output.docx>")
-        sys.exit(1)
-    
-    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+
+class CompiledTemplate:
+    """Template loaded and compiled once, rendered for many records.
+
+    DocxTemplate.render() unzips and parses the .docx, patches the XML and
+    compiles it with Jinja on every call. Here that happens once: body,
+    headers, footers, footnotes and templated core properties are kept as
+    compiled Jinja templates, and each render only runs them and zips the
+    result together with the untouched parts copied from the template.
+
+    The output matches DocxTemplate.render() + save() for plain data (the
+    strings, numbers, lists and dicts that come from JSON or CSV). Objects
+    that add parts or relationships (InlineImage, Subdoc, RichText with
+    links) need the regular fill_template().
+    """
+
+    def __init__(self, template_path, timings=None):
+        with phase(timings, "load"):
+            self._load(template_path)
+
+    def _load(self, template_path):
+        with open(template_path, "rb") as f:
+            self.source = f.read()
+
+        self.tpl = DocxTemplate(io.BytesIO(self.source))
+        self.tpl.render_init()
+        self.env = Environment()
+        docx = self.tpl.docx
+
+        self.document_name = docx.part.partname[1:]
+        self.body = self._compile(self.tpl.patch_xml(self.tpl.get_xml()))
+
+        # zip entry name -> (owning part, compiled template, serializer)
+        self.parts = {}
+        for uri in (self.tpl.HEADER_URI, self.tpl.FOOTER_URI):
+            for _, part in self.tpl.get_headers_footers(uri):
+                xml = self.tpl.patch_xml(self.tpl.get_part_xml(part))
+                self.parts[part.partname[1:]] = (part, self._compile(xml), _serialize_xml)
+        for part in docx.part.package.parts:
+            if part.content_type == CT.WML_FOOTNOTES:
+                blob = part.blob.decode("utf-8") if isinstance(part.blob, bytes) else part.blob
+                xml = self.tpl.patch_xml(blob)
+                self.parts[part.partname[1:]] = (part, self._compile(xml), _encode_xml)
+
+        # Like render_properties(), every property in TEMPLATED_PROPERTIES is
+        # rewritten, so core.xml is always regenerated. python-docx adds a
+        # core properties part if the template has none; the base archive is
+        # then built from a re-saved template that includes it.
+        core_properties = docx.core_properties
+        for part in docx.part.package.parts:
+            if part.content_type == CT.OPC_CORE_PROPERTIES:
+                self.core_name = part.partname[1:]
+        with zipfile.ZipFile(io.BytesIO(self.source)) as src:
+            has_core = self.core_name in src.namelist()
+        if not has_core:
+            saved = io.BytesIO()
+            docx.save(saved)
+            self.source = saved.getvalue()
+        self.properties = {}
+        for prop in TEMPLATED_PROPERTIES:
+            initial = getattr(core_properties, prop)
+            if "{" in initial:
+                self.properties[prop] = self.env.from_string(initial)
+            else:
+                setattr(core_properties, prop, self.env.from_string(initial).render())
+        self.core_xml = None if self.properties else serialize_part_xml(core_properties._element)
+
+        # Parts that never change are compressed once into a base archive;
+        # each render appends only the rendered parts to a copy of it.
+        rendered = {self.document_name, self.core_name, *self.parts}
+        self.rendered_entries = {}
+        base = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(self.source)) as src, \
+                zipfile.ZipFile(base, "w", zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                if info.filename in rendered:
+                    self.rendered_entries[info.filename] = info
+                else:
+                    dst.writestr(info, src.read(info))
+        self.base = base.getvalue()
+
+    def _compile(self, src_xml):
+        # same preprocessing as DocxTemplate.render_xml_part()
+        return self.env.from_string(re.sub(r"<w:p([ >])", r"\n<w:p\1", src_xml))
+
+    def _render_part(self, template, part, context):
+        self.tpl.current_rendering_part = part
+        dst_xml = template.render(context)
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.tpl.resolve_listing(dst_xml)
+
+    def _render_document(self, context):
+        docx = self.tpl.docx
+        self.tpl.docx_ids_index = 1000
+        tree = self.tpl.fix_tables(self._render_part(self.body, docx.part, context))
+        self.tpl.fix_docpr_ids(tree)
+        root = docx.element
+        body = root.body
+        root.replace(body, tree)
+        try:
+            return serialize_part_xml(root)
+        finally:
+            root.replace(tree, body)
+
+    def _render_parts(self, context):
+        rendered = {self.document_name: self._render_document(context)}
+        for name, (part, template, serialize) in self.parts.items():
+            rendered[name] = serialize(self._render_part(template, part, context))
+        if self.properties:
+            core_properties = self.tpl.docx.core_properties
+            for prop, template in self.properties.items():
+                setattr(core_properties, prop, template.render(context))
+            rendered[self.core_name] = serialize_part_xml(core_properties._element)
+        else:
+            rendered[self.core_name] = self.core_xml
+        return rendered
+
+    def _zip(self, rendered):
+        out = io.BytesIO(self.base)
+        with zipfile.ZipFile(out, "a", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in rendered.items():
+                archive.writestr(self.rendered_entries[name], data)
+        return out.getvalue()
+
+    def render(self, context, timings=None):
+        """Render one record and return the .docx file content."""
+        with phase(timings, "render"):
+            rendered = self._render_parts(context)
+        with phase(timings, "save"):
+            return self._zip(rendered)
+
+    def save(self, context, output_path, timings=None):
+        with phase(timings, "render"):
+            rendered = self._render_parts(context)
+        with phase(timings, "save"):
+            content = self._zip(rendered)
+            with open(output_path, "wb") as f:
+                f.write(content)
+        return output_path
+
+
+def _serialize_xml(xml):
+    return serialize_part_xml(parse_xml(xml.encode("utf-8")))
+
+
+def _encode_xml(xml):
+    return xml.encode("utf-8")
+
+
+def load_records(path):
+    """Load records from .csv (header row), .jsonl (object per line) or .json (list).
+
+    CSV columns with dotted names (`party.name`) become nested objects.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return [_unflatten(row) for row in csv.DictReader(f)]
+    with open(path, "r", encoding="utf-8") as f:
+        if ext == ".jsonl":
+            return [json.loads(line) for line in f if line.strip()]
         data = json.load(f)
-    
-    result = fill_template(sys.argv[1], data, sys.argv[3])
-    print(f"✓ Created: {result}")
+    return data if isinstance(data, list) else [data]
+
+
+def _unflatten(row):
+    record = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        *parents, name = key.split(".")
+        target = record
+        for parent in parents:
+            target = target.setdefault(parent, {})
+            if not isinstance(target, dict):
+                raise ValueError(f"CSV column {key} conflicts with column {parent}")
+        target[name] = value
+    return record
+
+
+def output_name(pattern, index, record):
+    """Build output file name from pattern, e.g. "{index:04d}_{client_name}.docx".
+
+    {index} is always the record counter, even if the record has an "index" field.
+    """
+    name = UNSAFE_FILENAME_CHARS.sub("_", pattern.format_map({**record, "index": index})).strip()
+    if not name.lower().endswith(".docx"):
+        name += ".docx"
+    return name
+
+
+_compiled = None
+_worker_timings = None
+
+
+def _init_worker(template_path, timed=False):
+    global _compiled, _worker_timings
+    _worker_timings = PhaseTimer() if timed else None
+    _compiled = CompiledTemplate(template_path, _worker_timings)
+
+
+def _render_job(job):
+    index, record, output_path = job
+    result = {"index": index, "output": output_path, "error": None}
+    try:
+        _compiled.save(record, output_path, _worker_timings)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    if _worker_timings is not None:
+        result["timings"] = _worker_timings.drain()
+    return result
+
+
+def fill_batch(template_path, records, output_dir, pattern=DEFAULT_PATTERN, workers=None,
+               validate_records=True, timings=None):
+    """Render every record with one compiled template.
+
+    Records are first checked against the template schema (see
+    extract_schema.py), so malformed ones fail before any rendering starts.
+    The rest are rendered by a pool of worker processes, each compiling the
+    template once. A failed record does not stop the run: it is returned
+    with its error message. Indexes in results and in the pattern start at 1.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    with phase(timings, "validate"):
+        schema = extract_schema(template_path)["schema"] if validate_records else None
+
+    results = []
+    jobs = []
+    seen = set()
+    for index, record in enumerate(records, 1):
+        try:
+            if not isinstance(record, dict):
+                raise TypeError(f"record must be an object, got {type(record).__name__}")
+            if schema is not None:
+                with phase(timings, "validate"):
+                    errors = validate(schema, record)
+                if errors:
+                    raise ValueError("; ".join(errors))
+            name = output_name(pattern, index, record)
+            if name in seen:
+                raise ValueError(f"duplicate output name {name}")
+        except Exception as e:
+            results.append({"index": index, "output": None, "error": f"{type(e).__name__}: {e}"})
+            continue
+        seen.add(name)
+        jobs.append((index, record, os.path.join(output_dir, name)))
+
+    timed = timings is not None
+    if workers == 1 or len(jobs) <= 1:
+        _init_worker(template_path, timed)
+        results.extend(map(_render_job, jobs))
+    else:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(template_path, timed)) as pool:
+            results.extend(pool.map(_render_job, jobs, chunksize=chunksize))
+
+    for r in results:
+        if "timings" in r:
+            timings.merge(r.pop("timings"))
+    results.sort(key=lambda r: r["index"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill docx template with provided data.")
+    parser.add_argument("template", help="template .docx")
+    parser.add_argument("data", help="data .json (or records .csv/.jsonl/.json with --batch)")
+    parser.add_argument("output", help="output .docx (or output directory with --batch)")
+    parser.add_argument("--batch", action="store_true", help="render one document per record")
+    parser.add_argument("--pattern", default=DEFAULT_PATTERN,
+                        help=f"output file name pattern with {{index}} and record fields (default {DEFAULT_PATTERN})")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--report", help="write per-record results to this JSON file")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="do not check records against the template schema before rendering")
+    parser.add_argument("--timings", action="store_true",
+                        help="print per-phase timing breakdown as JSON to stderr")
+    args = parser.parse_args()
+    timings = PhaseTimer() if args.timings else None
+
+    if not args.batch:
+        with open(args.data, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        result = fill_template(args.template, data, args.output, timings)
+        print(f"✓ Created: {result}")
+        if timings is not None:
+            print(json.dumps({"timings": timings.report()}), file=sys.stderr)
+        return
+
+    with phase(timings, "load"):
+        records = load_records(args.data)
+    results = fill_batch(args.template, records, args.output,
+                         pattern=args.pattern, workers=args.workers,
+                         validate_records=not args.no_validate, timings=timings)
+    failed = [r for r in results if r["error"]]
+    for r in failed:
+        print(f"✗ Record {r['index']}: {r['error']}", file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"✓ Created: {len(results) - len(failed)} of {len(results)} in {args.output}")
+    if timings is not None:
+        print(json.dumps({"timings": timings.report()}), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Per-phase timing breakdown for the --timings flag."""
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class PhaseTimer:
+    """Accumulates wall time and call counts per named phase.
+
+    Batch workers send drain() results back to the parent, which merges them,
+    so phase totals are summed over workers and can exceed total_ms.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, seconds, calls=1):
+        total, count = self.phases.get(name, (0.0, 0))
+        self.phases[name] = (total + seconds, count + calls)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def drain(self):
+        """Return the collected phases and start over."""
+        phases, self.phases = self.phases, {}
+        return phases
+
+    def merge(self, raw):
+        for name, (seconds, calls) in raw.items():
+            self.add(name, seconds, calls)
+
+    def report(self):
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "phases": {name: {"ms": round(seconds * 1000, 3), "calls": calls}
+                       for name, (seconds, calls) in self.phases.items()},
+        }
+
+
+def phase(timings, name):
+    """Time a phase if timings is enabled, otherwise do nothing."""
+    return timings.phase(name) if timings is not None else nullcontext()
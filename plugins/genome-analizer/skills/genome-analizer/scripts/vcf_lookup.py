@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Быстрый поиск генотипов по rsID в VCF файле
+Один раз строит индекс rsID -> смещение в файле (SQLite рядом с VCF, а если
+каталог только для чтения — в cache/ скилла), дальше
+каждый запрос читает только нужные строки. Поддерживает обычный VCF и
+bgzip (.vcf.gz, как у tabix)
+"""
+
+import os
+import sys
+import json
+import zlib
+import struct
+import hashlib
+import sqlite3
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+INDEX_SUFFIX = '.rsidx'
+INDEX_VERSION = 1
+
+# Сюда кладется индекс, если в каталог с VCF нельзя писать
+CACHE_DIR = Path(__file__).resolve().parent.parent / 'cache' / 'vcf_index'
+
+# Сколько записей вставлять в индекс за одну транзакцию
+INSERT_BATCH = 50000
+
+# Ограничение SQLite на число параметров в одном запросе
+QUERY_BATCH = 900
+
+GZIP_MAGIC = b'\x1f\x8b'
+BGZF_HEADER_SIZE = 18
+
+
+class VcfIndexError(Exception):
+    """Ошибка чтения VCF или индекса"""
+
+
+def is_bgzf(path: Path) -> bool:
+    """
+    Проверяет, сжат ли файл в формате BGZF (bgzip/tabix).
+
+    Args:
+        path: Путь к файлу
+
+    Returns:
+        True если первый блок — gzip с подполем BC
+    """
+    with open(path, 'rb') as f:
+        header = f.read(BGZF_HEADER_SIZE)
+    return (
+        len(header) == BGZF_HEADER_SIZE
+        and header[:2] == GZIP_MAGIC
+        and header[3] & 4 != 0
+        and header[12:14] == b'BC'
+    )
+
+
+def _read_bgzf_block(f) -> Optional[Tuple[int, bytes]]:
+    """
+    Читает и распаковывает один BGZF блок с текущей позиции.
+
+    Returns:
+        (смещение блока в сжатом файле, распакованные данные) или None в конце файла
+    """
+    offset = f.tell()
+    header = f.read(BGZF_HEADER_SIZE)
+    if not header:
+        return None
+    if len(header) < BGZF_HEADER_SIZE or header[:2] != GZIP_MAGIC or header[12:14] != b'BC':
+        raise VcfIndexError(f'Поврежденный BGZF блок по смещению {offset}')
+    block_size = struct.unpack('<H', header[16:18])[0] + 1
+    rest = f.read(block_size - BGZF_HEADER_SIZE)
+    if len(rest) != block_size - BGZF_HEADER_SIZE:
+        raise VcfIndexError(f'Обрезанный BGZF блок по смещению {offset}')
+    # Сжатые данные без 8 байт трейлера (CRC32 и ISIZE)
+    return offset, zlib.decompress(rest[:-8], -15)
+
+
+def _iter_lines_plain(path: Path) -> Iterator[Tuple[int, bytes]]:
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            yield offset, line
+            offset += len(line)
+
+
+def _iter_lines_bgzf(path: Path) -> Iterator[Tuple[int, bytes]]:
+    """Строки bgzip файла с виртуальными смещениями (блок << 16 | позиция в блоке)"""
+    with open(path, 'rb') as f:
+        pending = b''
+        pending_offset = 0
+        while True:
+            block = _read_bgzf_block(f)
+            if block is None:
+                break
+            block_offset, data = block
+            start = 0
+            while True:
+                end = data.find(b'\n', start)
+                if end == -1:
+                    break
+                if pending:
+                    yield pending_offset, pending + data[start:end + 1]
+                    pending = b''
+                else:
+                    yield (block_offset << 16) | start, data[start:end + 1]
+                start = end + 1
+            if start < len(data):
+                # Строка продолжается в следующем блоке
+                if not pending:
+                    pending_offset = (block_offset << 16) | start
+                pending += data[start:]
+        if pending:
+            yield pending_offset, pending
+
+
+def iter_lines(path: Path) -> Iterator[Tuple[int, bytes]]:
+    """
+    Перебирает строки VCF вместе с их смещениями.
+
+    Args:
+        path: Путь к .vcf или bgzip .vcf.gz
+
+    Yields:
+        (смещение, строка в байтах)
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == GZIP_MAGIC:
+        if not is_bgzf(path):
+            raise VcfIndexError(
+                f'{path} сжат обычным gzip — произвольный доступ невозможен. '
+                f'Пересожмите: gunzip {path.name} && bgzip {path.stem}'
+            )
+        return _iter_lines_bgzf(path)
+    return _iter_lines_plain(path)
+
+
+class VcfReader:
+    """
+    Чтение строк VCF по смещениям из индекса.
+
+    Держит файл открытым и помнит последний распакованный BGZF блок: соседние
+    rsID часто лежат в одном блоке, и его не нужно распаковывать повторно.
+    """
+
+    def __init__(self, path: Path, bgzf: bool):
+        self.bgzf = bgzf
+        self._file = open(path, 'rb')
+        self._block_offset: Optional[int] = None
+        self._block_data = b''
+        self._next_offset = 0
+
+    def __enter__(self) -> 'VcfReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _block(self, offset: int) -> Optional[bytes]:
+        if offset != self._block_offset:
+            self._file.seek(offset)
+            block = _read_bgzf_block(self._file)
+            if block is None:
+                return None
+            self._block_offset, self._block_data = block
+            self._next_offset = self._file.tell()
+        return self._block_data
+
+    def read_line_at(self, offset: int) -> bytes:
+        """
+        Читает одну строку по смещению.
+
+        Args:
+            offset: Обычное или виртуальное (BGZF) смещение
+
+        Returns:
+            Строка в байтах
+        """
+        if not self.bgzf:
+            self._file.seek(offset)
+            return self._file.readline()
+
+        block_offset, within = offset >> 16, offset & 0xFFFF
+        parts = []
+        while True:
+            data = self._block(block_offset)
+            if data is None:
+                break
+            data = data[within:]
+            end = data.find(b'\n')
+            if end != -1:
+                parts.append(data[:end + 1])
+                break
+            # Строка продолжается в следующем блоке
+            parts.append(data)
+            block_offset, within = self._next_offset, 0
+        return b''.join(parts)
+
+
+def index_path_for(vcf_path: Path) -> Path:
+    """Путь к индексу рядом с VCF"""
+    return vcf_path.with_name(vcf_path.name + INDEX_SUFFIX)
+
+
+def default_index_path(vcf_path: Path) -> Path:
+    """
+    Выбирает, где хранить индекс, если путь не задан явно.
+
+    Рядом с VCF, если каталог доступен для записи или там уже лежит актуальный
+    индекс. Иначе — в CACHE_DIR под именем с хешем полного пути к VCF, чтобы
+    одноименные файлы из разных каталогов не перезаписывали друг друга.
+
+    Args:
+        vcf_path: Путь к VCF
+
+    Returns:
+        Путь к индексу
+    """
+    vcf_path = Path(vcf_path)
+    local = index_path_for(vcf_path)
+    if os.access(local.parent, os.W_OK | os.X_OK) or index_is_current(vcf_path, local):
+        return local
+    digest = hashlib.sha256(str(vcf_path.resolve()).encode('utf-8')).hexdigest()[:16]
+    return CACHE_DIR / f'{vcf_path.name}.{digest}{INDEX_SUFFIX}'
+
+
+def _vcf_fingerprint(vcf_path: Path) -> Dict[str, int]:
+    stat = vcf_path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_index(vcf_path: Path, index_path: Optional[Path] = None) -> Path:
+    """
+    Строит индекс rsID -> смещение строки.
+
+    Несколько ID через ; индексируются по отдельности; при повторах
+    сохраняется первая запись.
+
+    Args:
+        vcf_path: Путь к VCF
+        index_path: Куда сохранить индекс (по умолчанию см. default_index_path)
+
+    Returns:
+        Путь к построенному индексу
+
+    Raises:
+        VcfIndexError: VCF не читается или индекс некуда записать
+    """
+    vcf_path = Path(vcf_path)
+    index_path = Path(index_path) if index_path else default_index_path(vcf_path)
+    tmp_path = index_path.with_name(index_path.name + '.tmp')
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        if tmp_path.exists():
+            tmp_path.unlink()
+        _write_index(vcf_path, tmp_path)
+        os.replace(tmp_path, index_path)
+    except (sqlite3.Error, OSError) as e:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise VcfIndexError(
+            f'Не удалось записать индекс {index_path}: {e}. Укажите другой путь через --index'
+        ) from e
+    return index_path
+
+
+def _write_index(vcf_path: Path, tmp_path: Path) -> None:
+    bgzf = is_bgzf(vcf_path)
+    samples: List[str] = []
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        conn.execute('CREATE TABLE rsids (id TEXT PRIMARY KEY, offset INTEGER NOT NULL) WITHOUT ROWID')
+
+        batch = []
+        insert = 'INSERT OR IGNORE INTO rsids (id, offset) VALUES (?, ?)'
+        for offset, line in iter_lines(vcf_path):
+            if line.startswith(b'#'):
+                if line.startswith(b'#CHROM'):
+                    samples = line.rstrip(b'\r\n').decode('utf-8').split('\t')[9:]
+                continue
+            fields = line.split(b'\t', 3)
+            if len(fields) < 4 or fields[2] == b'.':
+                continue
+            for variant_id in fields[2].split(b';'):
+                batch.append((variant_id.decode('ascii', errors='replace'), offset))
+            if len(batch) >= INSERT_BATCH:
+                conn.executemany(insert, batch)
+                batch = []
+        if batch:
+            conn.executemany(insert, batch)
+
+        meta = {
+            'version': INDEX_VERSION,
+            'vcf': str(vcf_path.resolve()),
+            'bgzf': bgzf,
+            'samples': samples,
+            **_vcf_fingerprint(vcf_path),
+        }
+        conn.executemany(
+            'INSERT INTO meta (key, value) VALUES (?, ?)',
+            [(key, json.dumps(value)) for key, value in meta.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _connect_read_only(index_path: Path) -> sqlite3.Connection:
+    """Открывает индекс только на чтение; путь экранируется (%, ? и # в URI)"""
+    return sqlite3.connect(Path(index_path).resolve().as_uri() + '?mode=ro', uri=True)
+
+
+def _load_meta(conn: sqlite3.Connection) -> dict:
+    return {key: json.loads(value) for key, value in conn.execute('SELECT key, value FROM meta')}
+
+
+def index_is_current(vcf_path: Path, index_path: Path) -> bool:
+    """
+    Проверяет, что индекс существует и построен по текущей версии VCF.
+
+    Returns:
+        True если индекс можно использовать
+    """
+    if not index_path.exists():
+        return False
+    try:
+        conn = _connect_read_only(index_path)
+        try:
+            meta = _load_meta(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    fingerprint = _vcf_fingerprint(vcf_path)
+    return (
+        meta.get('version') == INDEX_VERSION
+        and meta.get('size') == fingerprint['size']
+        and meta.get('mtime_ns') == fingerprint['mtime_ns']
+    )
+
+
+def decode_genotype(gt: str, alleles: List[str]) -> Dict[str, object]:
+    """
+    Расшифровывает поле GT в аллели и зиготность.
+
+    Args:
+        gt: Значение GT, например 0/1, 1|1, 0, ./.
+        alleles: [REF, ALT1, ALT2, ...]
+
+    Returns:
+        Словарь с genotype (например A/G) и zygosity:
+        homozygous_ref, heterozygous, homozygous_alt, hemizygous_ref,
+        hemizygous_alt или no_call
+    """
+    separator = '|' if '|' in gt else '/'
+    indices = gt.split(separator) if gt else ['.']
+
+    if any(index == '.' or not index.isdigit() or int(index) >= len(alleles) for index in indices):
+        return {'genotype': None, 'zygosity': 'no_call'}
+
+    numbers = [int(index) for index in indices]
+    genotype = separator.join(alleles[n] for n in numbers)
+
+    if len(numbers) == 1:
+        zygosity = 'hemizygous_ref' if numbers[0] == 0 else 'hemizygous_alt'
+    elif len(set(numbers)) > 1:
+        zygosity = 'heterozygous'
+    elif numbers[0] == 0:
+        zygosity = 'homozygous_ref'
+    else:
+        zygosity = 'homozygous_alt'
+
+    return {'genotype': genotype, 'zygosity': zygosity}
+
+
+def parse_record(line: bytes, samples: List[str], sample: Optional[str] = None) -> dict:
+    """
+    Разбирает строку VCF в запись с генотипом выбранного образца.
+
+    Args:
+        line: Строка VCF
+        samples: Имена образцов из заголовка
+        sample: Имя образца (по умолчанию первый)
+
+    Returns:
+        Словарь с chrom, pos, id, ref, alt, filter, gt, genotype, zygosity
+    """
+    fields = line.rstrip(b'\r\n').decode('utf-8').split('\t')
+    chrom, pos, variant_id, ref, alt = fields[:5]
+    alt_alleles = [] if alt == '.' else alt.split(',')
+    record = {
+        'chrom': chrom,
+        'pos': int(pos),
+        'id': variant_id,
+        'ref': ref,
+        'alt': alt_alleles,
+        'filter': fields[6] if len(fields) > 6 else None,
+    }
+
+    column = 9
+    if sample is not None:
+        column += samples.index(sample)
+    if len(fields) <= column:
+        record.update({'gt': None, 'genotype': None, 'zygosity': 'no_call'})
+        return record
+
+    format_keys = fields[8].split(':')
+    values = fields[column].split(':')
+    gt = values[format_keys.index('GT')] if 'GT' in format_keys and format_keys.index('GT') < len(values) else ''
+    record['gt'] = gt or None
+    record.update(decode_genotype(gt, [ref] + alt_alleles))
+    return record
+
+
+def lookup(
+    vcf_path: Path,
+    rsids: Iterable[str],
+    sample: Optional[str] = None,
+    index_path: Optional[Path] = None,
+    rebuild: bool = False
+) -> Dict[str, Optional[dict]]:
+    """
+    Находит генотипы по списку rsID, при необходимости строя индекс.
+
+    Args:
+        vcf_path: Путь к VCF
+        rsids: Список rsID
+        sample: Имя образца (по умолчанию первый в файле)
+        index_path: Путь к индексу (по умолчанию см. default_index_path)
+        rebuild: Перестроить индекс принудительно
+
+    Returns:
+        rsID -> запись (см. parse_record) или None если rsID нет в файле,
+        в порядке запроса
+    """
+    vcf_path = Path(vcf_path)
+    index_path = Path(index_path) if index_path else default_index_path(vcf_path)
+    if rebuild or not index_is_current(vcf_path, index_path):
+        build_index(vcf_path, index_path)
+
+    wanted = list(dict.fromkeys(rsid.strip() for rsid in rsids if rsid.strip()))
+    try:
+        conn = _connect_read_only(index_path)
+        try:
+            meta = _load_meta(conn)
+            offsets = {}
+            for start in range(0, len(wanted), QUERY_BATCH):
+                chunk = wanted[start:start + QUERY_BATCH]
+                placeholders = ','.join('?' * len(chunk))
+                offsets.update(conn.execute(
+                    f'SELECT id, offset FROM rsids WHERE id IN ({placeholders})', chunk
+                ))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise VcfIndexError(f'Не удалось прочитать индекс {index_path}: {e}. Перестройте его (--rebuild)') from e
+
+    samples = meta.get('samples', [])
+    if sample is not None and sample not in samples:
+        raise VcfIndexError(f'Образец {sample} не найден; есть: {", ".join(samples) or "нет"}')
+
+    results: Dict[str, Optional[dict]] = {}
+    # Читаем в порядке смещений, чтобы двигаться по файлу вперед
+    with VcfReader(vcf_path, meta['bgzf']) as reader:
+        for rsid, offset in sorted(offsets.items(), key=lambda item: item[1]):
+            results[rsid] = parse_record(reader.read_line_at(offset), samples, sample)
+    return {rsid: results.get(rsid) for rsid in wanted}
+
+
+def _split_rsids(values: Iterable[str]) -> List[str]:
+    rsids = []
+    for value in values:
+        for part in value.replace('|', ',').replace(';', ',').replace(' ', ',').split(','):
+            if part.strip():
+                rsids.append(part.strip())
+    return rsids
+
+
+def main():
+    """CLI интерфейс для скрипта"""
+    parser = argparse.ArgumentParser(
+        description='Поиск генотипов по rsID в VCF через постоянный индекс'
+    )
+    parser.add_argument('vcf', help='Путь к .vcf или bgzip .vcf.gz')
+    parser.add_argument(
+        'rsids',
+        nargs='*',
+        help='rsID через пробел, запятую или | (например rs123 rs456 или "rs123|rs456")'
+    )
+    parser.add_argument('--file', help='Файл со списком rsID (- для stdin)')
+    parser.add_argument('--sample', help='Имя образца (по умолчанию первый в VCF)')
+    parser.add_argument('--build', action='store_true', help='Только построить индекс')
+    parser.add_argument('--rebuild', action='store_true', help='Перестроить индекс принудительно')
+    parser.add_argument(
+        '--index',
+        help='Путь к файлу индекса (по умолчанию рядом с VCF, для каталога только для чтения — в cache/ скилла)'
+    )
+
+    args = parser.parse_args()
+
+    vcf_path = Path(args.vcf)
+    if not vcf_path.exists():
+        print(f'Ошибка: файл {vcf_path} не найден', file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.build:
+            index_path = Path(args.index) if args.index else default_index_path(vcf_path)
+            if args.rebuild or not index_is_current(vcf_path, index_path):
+                build_index(vcf_path, index_path)
+            print(f'✓ Индекс: {index_path}')
+            return
+
+        values = list(args.rsids)
+        if args.file:
+            source = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+            with source:
+                values.extend(source.read().split())
+        rsids = _split_rsids(values)
+        if not rsids:
+            parser.error('укажите хотя бы один rsID')
+
+        result = lookup(vcf_path, rsids, sample=args.sample, index_path=args.index, rebuild=args.rebuild)
+    except VcfIndexError as e:
+        print(f'Ошибка: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк бэкендов извлечения текста из HTML
+Прогоняет корпус сохраненных страниц через каждый бэкенд scrape.py и выводит
+скорость (МБ/с), пиковую память и совпадение результата с эталоном bs4
+"""
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from scrape import EXTRACTORS, available_extractors, extract_text_from_html
+
+
+REFERENCE_BACKEND = 'bs4'
+
+
+def collect_pages(paths: List[str]) -> List[Path]:
+    """
+    Собирает файлы корпуса: отдельные файлы и *.html / *.htm из директорий.
+
+    Args:
+        paths: Пути к файлам и директориям
+
+    Returns:
+        Отсортированный список файлов
+    """
+    pages = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            pages.extend(p for p in path.rglob('*') if p.suffix.lower() in ('.html', '.htm'))
+        elif path.is_file():
+            pages.append(path)
+    return sorted(set(pages))
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS процесса в МБ (None если недоступно на платформе)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS — байты
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def run_worker(backend: str, pages: List[Path], repeat: int) -> dict:
+    """
+    Замеряет один бэкенд в текущем процессе.
+
+    Args:
+        backend: Имя бэкенда
+        pages: Файлы корпуса
+        repeat: Число прогонов (берется лучший)
+
+    Returns:
+        Словарь с метриками и хешами результатов по страницам
+    """
+    documents = [page.read_bytes().decode('utf-8', errors='replace') for page in pages]
+    total_bytes = sum(len(doc.encode('utf-8')) for doc in documents)
+    baseline_rss = peak_rss_mb()
+
+    best = None
+    digests = []
+    for _ in range(max(1, repeat)):
+        digests = []
+        started = time.perf_counter()
+        for doc in documents:
+            text = extract_text_from_html(doc, backend)
+            digests.append(hashlib.sha1(text.encode('utf-8')).hexdigest())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak_rss = peak_rss_mb()
+    megabytes = total_bytes / (1024 * 1024)
+    return {
+        'backend': backend,
+        'pages': len(documents),
+        'megabytes': round(megabytes, 3),
+        'seconds': round(best, 4),
+        'mb_per_sec': round(megabytes / best, 2) if best else None,
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        'extra_rss_mb': round(peak_rss - baseline_rss, 1) if peak_rss is not None else None,
+        'digests': digests,
+    }
+
+
+def measure(backend: str, pages: List[Path], repeat: int) -> dict:
+    """Запускает замер бэкенда в отдельном процессе, чтобы пиковая память не смешивалась"""
+    command = [
+        sys.executable, str(Path(__file__).resolve()),
+        '--worker', backend, '--repeat', str(repeat),
+        *map(str, pages)
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout)
+
+
+def print_table(results: List[dict]) -> None:
+    header = f"{'backend':<8} {'pages':>6} {'MB':>8} {'sec':>8} {'MB/s':>8} {'peak MB':>8} {'+RSS MB':>8} {'identical':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(
+            f"{r['backend']:<8} {r['pages']:>6} {r['megabytes']:>8.2f} {r['seconds']:>8.3f} "
+            f"{r['mb_per_sec'] or 0:>8.2f} {r['peak_rss_mb'] or 0:>8.1f} {r['extra_rss_mb'] or 0:>8.1f} "
+            f"{r['identical']:>4}/{r['pages']:<5}"
+        )
+
+
+def main():
+    """CLI интерфейс для скрипта"""
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк бэкендов извлечения текста на корпусе сохраненных HTML-страниц'
+    )
+    parser.add_argument('paths', nargs='+', help='HTML-файлы или директории с ними')
+    parser.add_argument(
+        '--backends',
+        default=','.join(available_extractors()),
+        help='Бэкенды через запятую (по умолчанию все доступные)'
+    )
+    parser.add_argument('--repeat', type=int, default=3, help='Число прогонов, берется лучший (по умолчанию 3)')
+    parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    pages = collect_pages(args.paths)
+    if not pages:
+        print('Ошибка: не найдено ни одной HTML-страницы', file=sys.stderr)
+        sys.exit(1)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, pages, args.repeat)))
+        return
+
+    backends = [name.strip() for name in args.backends.split(',') if name.strip()]
+    for name in backends:
+        if name not in EXTRACTORS:
+            parser.error(f'неизвестный бэкенд {name}; доступны: {", ".join(EXTRACTORS)}')
+        if name not in available_extractors():
+            parser.error(f'бэкенд {name} недоступен: установите пакет {name}')
+
+    # Эталон для проверки идентичности результата — исходная реализация на bs4
+    if REFERENCE_BACKEND not in backends:
+        backends.append(REFERENCE_BACKEND)
+
+    results = [measure(name, pages, args.repeat) for name in backends]
+    reference = next(r for r in results if r['backend'] == REFERENCE_BACKEND)['digests']
+    for r in results:
+        r['identical'] = sum(a == b for a, b in zip(r.pop('digests'), reference))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
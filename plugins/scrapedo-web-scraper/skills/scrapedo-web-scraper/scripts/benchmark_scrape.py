@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк scrape.py на локальной заглушке Scrape.do
+Поднимает HTTP-сервер, который отвечает как api.scrape.do сгенерированными
+HTML-страницами разного размера, и замеряет без сети и без расхода кредитов:
+- время импорта и старта CLI
+- задержку одиночного запроса (перцентили) и разбивку по фазам
+- пропускную способность batch-режима и пиковую память процесса
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SCRIPT = Path(__file__).resolve().parent / 'scrape.py'
+
+STUB_TOKEN = 'benchmark-token'
+
+# Размеры сгенерированных страниц (байт)
+FIXTURE_SIZES = {
+    'small': 20 * 1024,
+    'medium': 300 * 1024,
+    'large': 3 * 1024 * 1024,
+}
+
+WORDS = (
+    'доставка цена купить отзывы каталог товар скидка гарантия сервис заказ '
+    'product price review shipping warranty catalog order service quality'
+).split()
+
+
+def generate_page(size: int, seed: int = 0) -> str:
+    """
+    Генерирует правдоподобную HTML-страницу заданного размера.
+
+    Навигация, статьи с абзацами и ссылками, таблицы, встроенные скрипты и
+    стили — чтобы извлечение текста работало как на настоящих страницах.
+
+    Args:
+        size: Примерный размер страницы в байтах (UTF-8)
+        seed: Зерно генератора для воспроизводимости
+
+    Returns:
+        HTML-документ
+    """
+    rng = random.Random(seed)
+
+    def sentence(n: int) -> str:
+        return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+    head = (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        f'<title>{sentence(5)}</title>'
+        '<style>body{font-family:sans-serif}.card{padding:8px}</style>'
+        '<script>window.dataLayer=window.dataLayer||[];function gtag(){dataLayer.push(arguments)}</script>'
+        '</head><body><nav><ul>'
+        + ''.join(f'<li><a href="/c/{i}">{rng.choice(WORDS)}</a></li>' for i in range(12))
+        + '</ul></nav><main>'
+    )
+    tail = '</main><footer><p>&copy; 2025 &laquo;Магазин&raquo;</p></footer></body></html>'
+
+    parts = [head]
+    length = len(head.encode('utf-8')) + len(tail.encode('utf-8'))
+    block = 0
+    while length < size:
+        kind = block % 4
+        if kind == 3:
+            rows = ''.join(
+                f'<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(100, 99999)} ₽</td></tr>'
+                for _ in range(8)
+            )
+            html = f'<table class="prices"><tbody>{rows}</tbody></table>'
+        elif kind == 2:
+            html = f'<script>var item{block}={{"id":{block},"tags":["{rng.choice(WORDS)}"]}};</script>'
+        else:
+            paragraphs = ''.join(
+                f'<p>{sentence(rng.randint(8, 30))} <a href="/p/{block}">{rng.choice(WORDS)}</a> '
+                f'<b>{sentence(4)}</b></p>'
+                for _ in range(rng.randint(2, 5))
+            )
+            html = f'<article class="card"><h2>{sentence(4)}</h2>{paragraphs}</article>'
+        parts.append(html)
+        length += len(html.encode('utf-8'))
+        block += 1
+    parts.append(tail)
+    return ''.join(parts)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Отвечает как api.scrape.do: GET /?token=...&url=...
+
+    Размер страницы берется из первого сегмента пути целевого URL
+    (http://fixture.local/medium/17), неверный токен дает 401.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными write: без этого Nagle + delayed ACK
+    # добавляют ~40 мс к каждому ответу и замер показывает заглушку, а не клиент
+    disable_nagle_algorithm = True
+    pages = {}
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        if query.get('token', [''])[0] != STUB_TOKEN:
+            self._send(401, b'Unauthorized')
+            return
+        target = urlsplit(query.get('url', [''])[0])
+        size = target.path.strip('/').split('/')[0]
+        body = self.pages.get(size)
+        if body is None:
+            self._send(404, b'Unknown fixture')
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        self._send(200, body, 'text/html; charset=utf-8')
+
+    def _send(self, status: int, body: bytes, content_type: str = 'text/plain; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port: int, latency_ms: float, sizes: List[str]) -> None:
+    """Запускает заглушку и печатает в stdout выбранный порт"""
+    StubHandler.pages = {
+        name: generate_page(FIXTURE_SIZES[name], seed=i).encode('utf-8')
+        for i, name in enumerate(sizes)
+    }
+    StubHandler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+def start_stub(latency_ms: float, sizes: List[str]):
+    """
+    Поднимает заглушку в отдельном процессе, чтобы она не делила GIL с клиентом.
+
+    Returns:
+        Пара (процесс, адрес API)
+    """
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), '--serve',
+         '--latency-ms', str(latency_ms), '--sizes', ','.join(sizes)],
+        stdout=subprocess.PIPE, text=True
+    )
+    port = int(process.stdout.readline())
+    return process, f'http://127.0.0.1:{port}/'
+
+
+def percentiles(values: List[float]) -> dict:
+    """p50/p90/p99, среднее и максимум в миллисекундах"""
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        'p50_ms': round(pick(0.50) * 1000, 2),
+        'p90_ms': round(pick(0.90) * 1000, 2),
+        'p99_ms': round(pick(0.99) * 1000, 2),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+    }
+
+
+def run_child(command: List[str], env: Optional[dict] = None) -> dict:
+    """
+    Запускает процесс и возвращает время, код выхода, пиковый RSS и вывод.
+
+    RSS берется из os.wait4 — это пик именно этого процесса, а не максимум
+    по всем дочерним процессам бенчмарка.
+    """
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, stdout=out, stderr=err, env=env)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        err.seek(0)
+        rss = usage.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+        return {
+            'seconds': elapsed,
+            'returncode': process.returncode,
+            'peak_rss_mb': round(rss, 1),
+            'stdout': out.read().decode('utf-8', errors='replace'),
+            'stderr': err.read().decode('utf-8', errors='replace'),
+        }
+
+
+def _timings_from(stderr: str) -> Optional[dict]:
+    for line in stderr.splitlines():
+        if line.startswith('{"timings"'):
+            return json.loads(line)['timings']
+    return None
+
+
+def measure_startup(repeat: int) -> dict:
+    """Медианное время импорта модуля и запуска CLI (--help) в новом процессе"""
+    scripts_dir = str(SCRIPT.parent)
+    import_runs = [
+        run_child([sys.executable, '-c', f'import sys; sys.path.insert(0, {scripts_dir!r}); import scrape'])
+        for _ in range(repeat)
+    ]
+    help_runs = [run_child([sys.executable, str(SCRIPT), '--help']) for _ in range(repeat)]
+    baseline = [run_child([sys.executable, '-c', 'pass']) for _ in range(repeat)]
+
+    def median(runs):
+        return round(sorted(r['seconds'] for r in runs)[len(runs) // 2] * 1000, 1)
+
+    return {
+        'python_ms': median(baseline),
+        'import_ms': median(import_runs),
+        'cli_help_ms': median(help_runs),
+        'import_peak_rss_mb': max(r['peak_rss_mb'] for r in import_runs),
+    }
+
+
+def measure_latency(api: str, size: str, requests_count: int, extractor: str) -> dict:
+    """
+    Последовательные одиночные запросы в этом процессе через общую сессию.
+
+    Returns:
+        Перцентили задержки и разбивка по фазам PhaseTimer
+    """
+    sys.path.insert(0, str(SCRIPT.parent))
+    import scrape
+    scrape.SCRAPEDO_API = api
+
+    timings = scrape.PhaseTimer()
+    latencies = []
+    with scrape.create_session(1) as session:
+        # Прогрев соединения и импорта бэкенда
+        scrape.fetch_via_scrapedo(f'http://fixture.local/{size}/warmup', STUB_TOKEN, session,
+                                  extractor=extractor)
+        for i in range(requests_count):
+            started = time.perf_counter()
+            result = scrape.fetch_via_scrapedo(
+                f'http://fixture.local/{size}/{i}', STUB_TOKEN, session,
+                extractor=extractor, timings=timings
+            )
+            latencies.append(time.perf_counter() - started)
+            if not result['success']:
+                raise RuntimeError(result['content'])
+    return {**percentiles(latencies), 'timings': timings.report()['phases']}
+
+
+def measure_batch(api: str, size: str, urls_count: int, concurrency: int, extractor: str) -> dict:
+    """
+    Batch-режим CLI в отдельном процессе: страниц в секунду, МБ/с, пиковый RSS.
+    """
+    env = dict(os.environ, SCRAPEDO_API=api)
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as urls:
+        for i in range(urls_count):
+            urls.write(f'http://fixture.local/{size}/{i}\n')
+    try:
+        run = run_child([
+            sys.executable, str(SCRIPT), '--batch', urls.name, '--token', STUB_TOKEN,
+            '--no-cache', '--concurrency', str(concurrency), '--rate', '100000',
+            '--extractor', extractor, '--timings'
+        ], env=env)
+    finally:
+        os.unlink(urls.name)
+
+    ok = sum(json.loads(line)['success'] for line in run['stdout'].splitlines() if line.strip())
+    megabytes = FIXTURE_SIZES[size] * ok / (1024 * 1024)
+    return {
+        'urls': urls_count,
+        'ok': ok,
+        'seconds': round(run['seconds'], 3),
+        'pages_per_sec': round(ok / run['seconds'], 1),
+        'mb_per_sec': round(megabytes / run['seconds'], 2),
+        'peak_rss_mb': run['peak_rss_mb'],
+        'timings': (_timings_from(run['stderr']) or {}).get('phases'),
+    }
+
+
+def print_report(report: dict) -> None:
+    startup = report['startup']
+    print(f"startup: python {startup['python_ms']} ms, import scrape {startup['import_ms']} ms, "
+          f"cli --help {startup['cli_help_ms']} ms, import RSS {startup['import_peak_rss_mb']} MB")
+    print()
+    header = (f"{'size':<8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+              f"{'pages/s':>9} {'MB/s':>8} {'peak MB':>8}")
+    print(header)
+    print('-' * len(header))
+    for size, row in report['sizes'].items():
+        latency, batch = row['latency'], row['batch']
+        print(f"{size:<8} {latency['p50_ms']:>8.2f} {latency['p90_ms']:>8.2f} {latency['p99_ms']:>8.2f} "
+              f"{batch['pages_per_sec']:>9.1f} {batch['mb_per_sec']:>8.2f} {batch['peak_rss_mb']:>8.1f}")
+    print()
+    for size, row in report['sizes'].items():
+        phases = ', '.join(f"{name} {p['ms']:.0f} ms" for name, p in row['latency']['timings'].items())
+        print(f"{size}: {phases}")
+
+
+def main():
+    """CLI интерфейс для скрипта"""
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк scrape.py на локальной заглушке Scrape.do (без сети и расхода кредитов)'
+    )
+    parser.add_argument('--sizes', default=','.join(FIXTURE_SIZES),
+                        help=f'Размеры страниц через запятую: {", ".join(FIXTURE_SIZES)}')
+    parser.add_argument('--requests', type=int, default=30, help='Одиночных запросов на размер (по умолчанию 30)')
+    parser.add_argument('--batch-urls', type=int, default=100, help='URL в batch-прогоне на размер (по умолчанию 100)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Параллелизм batch-прогона (по умолчанию 8)')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='Искусственная задержка ответа заглушки, мс (по умолчанию 0)')
+    parser.add_argument('--extractor', default='stream', help='Бэкенд извлечения текста (по умолчанию stream)')
+    parser.add_argument('--startup-repeat', type=int, default=5, help='Повторов замера старта (по умолчанию 5)')
+    parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=0, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    sizes = [name.strip() for name in args.sizes.split(',') if name.strip()]
+    for name in sizes:
+        if name not in FIXTURE_SIZES:
+            parser.error(f'неизвестный размер {name}; доступны: {", ".join(FIXTURE_SIZES)}')
+
+    if args.serve:
+        serve(args.port, args.latency_ms, sizes)
+        return
+
+    stub, api = start_stub(args.latency_ms, sizes)
+    try:
+        report = {'startup': measure_startup(args.startup_repeat), 'sizes': {}}
+        for size in sizes:
+            report['sizes'][size] = {
+                'page_kb': FIXTURE_SIZES[size] // 1024,
+                'latency': measure_latency(api, size, args.requests, args.extractor),
+                'batch': measure_batch(api, size, args.batch_urls, args.concurrency, args.extractor),
+            }
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,117 @@ Web scraping через scrape.do API
 
 import os
 import sys
+import gzip
+import codecs
+import json
+import time
+import hashlib
+import random
+import threading
 import argparse
 import requests
 from bs4 import BeautifulSoup
-from typing import Optional
+from bs4.builder import HTMLTreeBuilder
+from html.parser import HTMLParser
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from typing import Callable, Iterable, Iterator, Optional, TextIO, Tuple
 from pathlib import Path
+from types import SimpleNamespace
+from contextlib import contextmanager, nullcontext
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+# Приватный модуль bs4: бэкенд stream наследует его обработку сущностей. Если
+# в новой версии bs4 модуля нет, stream недоступен и по умолчанию берется bs4
+try:
+    from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+except ImportError:
+    BeautifulSoupHTMLParser = None
+
+
+# Адрес API; переменная окружения SCRAPEDO_API направляет запросы на локальную
+# заглушку (используется бенчмарком benchmark_scrape.py)
+SCRAPEDO_API = os.environ.get('SCRAPEDO_API', 'http://api.scrape.do')
+
+# Параллелизм batch-режима по умолчанию
+DEFAULT_CONCURRENCY = 8
+
+# Потолок темпа запросов (запросов в секунду) и бюджет повторов на URL
+DEFAULT_RATE = 10.0
+DEFAULT_MAX_RETRIES = 3
+
+# Время жизни записи кеша (секунды) и предельный размер кеша на диске
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_CACHE_MAX_MB = 500
+
+DEFAULT_EXTRACTOR = 'stream' if BeautifulSoupHTMLParser is not None else 'bs4'
+
+# Предельный размер тела ответа (байт, 0 — без лимита) и размер чанка при чтении
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Поддеревья, которые удаляются целиком перед извлечением текста
+REMOVED_TAGS = frozenset({'script', 'style', 'noscript'})
+# Строки-контейнеры BeautifulSoup (template, rt, rp, ...): обычный текст
+# внутри них get_text() пропускает, а CDATA — нет
+STRING_CONTAINER_TAGS = frozenset(getattr(HTMLTreeBuilder, 'DEFAULT_STRING_CONTAINERS', {}))
+SKIPPED_TEXT_TAGS = REMOVED_TAGS | STRING_CONTAINER_TAGS
+EMPTY_ELEMENT_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS)
+
+
+class PhaseTimer:
+    """
+    Накопитель времени по фазам прогона для --timings.
+    
+    Фазы: token (поиск токена), cache (чтение и запись кеша), wait (ожидание
+    планировщика и паузы перед повтором), network (запрос и загрузка тела),
+    parse (извлечение текста), save (запись результата).
+    
+    Потокобезопасен. В batch-режиме время параллельных запросов суммируется,
+    поэтому сумма фаз может превышать общее время прогона.
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            total, calls = self._phases.get(name, (0.0, 0))
+            self._phases[name] = (total + seconds, calls + 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def report(self) -> dict:
+        """Сводка в миллисекундах: общее время и по фазам (время и число вызовов)"""
+        with self._lock:
+            phases = {
+                name: {'ms': round(total * 1000, 3), 'calls': calls}
+                for name, (total, calls) in self._phases.items()
+            }
+        return {
+            'total_ms': round((time.perf_counter() - self._started) * 1000, 3),
+            'phases': phases
+        }
+
+
+def _phase(timings: Optional[PhaseTimer], name: str):
+    """Замер фазы, если таймер включен"""
+    return timings.phase(name) if timings is not None else nullcontext()
 
 
 def get_token() -> Optional[str]:
@@ -58,16 +164,114 @@ def get_token() -> Optional[str]:
     return None
 
 
-def extract_text_from_html(html: str) -> str:
+def _join_lines(strings: Iterable[str]) -> str:
+    """Склеивает текстовые узлы и убирает избыточные пробелы и пустые строки"""
+    text = '\n'.join(strings)
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    return '\n'.join(lines)
+
+
+class StreamingTextExtractor(BeautifulSoupHTMLParser or HTMLParser):
     """
-    Извлекает текстовое содержимое из HTML.
+    Потоковое извлечение текста из HTML без построения дерева.
+    
+    Использует тот же токенизатор и ту же обработку сущностей, что
+    BeautifulSoup(html, 'html.parser'), и повторяет его правила закрытия тегов,
+    поэтому результат совпадает с бэкендом bs4. HTML можно подавать частями
+    через feed(); текст исключенных поддеревьев отбрасывается на лету.
+    
+    Использовать только если BeautifulSoupHTMLParser импортирован (см.
+    available_extractors): на голом HTMLParser сущности терялись бы.
     
     Args:
-        html: HTML строка
-        
-    Returns:
-        Извлеченный текст
+        on_string: Обработчик готовых текстовых узлов; если задан, узлы
+            не накапливаются в памяти и get_text() возвращает пустую строку
     """
+
+    def __init__(self, on_string: Optional[Callable[[str], None]] = None):
+        HTMLParser.__init__(self, convert_charrefs=False)
+        self.already_closed_empty_element = []
+        # handle_charref базового класса отмечает в soup замену символов на U+FFFD
+        self.soup = SimpleNamespace(contains_replacement_characters=False)
+        self._stack = []
+        self._open = {}
+        self._removed_depth = 0
+        self._container_depth = 0
+        self._data = []
+        self._strings = []
+        self._emit = on_string if on_string is not None else self._strings.append
+
+    def _flush(self) -> None:
+        if self._data:
+            if not self._removed_depth and not self._container_depth:
+                string = ''.join(self._data).strip()
+                if string:
+                    self._emit(string)
+            self._data = []
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush()
+        self._stack.append(tag)
+        self._open[tag] = self._open.get(tag, 0) + 1
+        if tag in REMOVED_TAGS:
+            self._removed_depth += 1
+        if tag in STRING_CONTAINER_TAGS:
+            self._container_depth += 1
+        if handle_empty_element and tag in EMPTY_ELEMENT_TAGS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed_empty_element.append(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed_empty_element:
+            self.already_closed_empty_element.remove(tag)
+            return
+        self._flush()
+        # Как BeautifulSoup: закрываем все до последнего открытого тега
+        # с этим именем; незакрытый тег без пары игнорируется
+        if not self._open.get(tag):
+            return
+        while self._stack:
+            name = self._stack.pop()
+            self._open[name] -= 1
+            if name in REMOVED_TAGS:
+                self._removed_depth -= 1
+            if name in STRING_CONTAINER_TAGS:
+                self._container_depth -= 1
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    # Комментарии, объявления и инструкции в текст не попадают,
+    # но разрывают текстовый узел
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA[') and not self._removed_depth:
+            string = data[len('CDATA['):].strip()
+            if string:
+                self._emit(string)
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def close(self) -> None:
+        HTMLParser.close(self)
+        self._flush()
+
+    def get_text(self) -> str:
+        """Текст, накопленный на текущий момент"""
+        return _join_lines(self._strings)
+
+
+def _extract_text_bs4(html: str) -> str:
     soup = BeautifulSoup(html, 'html.parser')
     
     # Удаляем скрипты и стили
@@ -78,19 +282,781 @@ def extract_text_from_html(html: str) -> str:
     text = soup.get_text(separator='\n', strip=True)
     
     # Убираем избыточные пробелы и пустые строки
-    lines = [line.strip() for line in text.splitlines()]
-    lines = [line for line in lines if line]
+    return _join_lines([text])
+
+
+def _extract_text_stream(html: str) -> str:
+    extractor = StreamingTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.get_text()
+
+
+def _extract_text_lxml(html: str) -> str:
+    if lxml_etree is None:
+        raise RuntimeError('Бэкенд lxml недоступен: установите пакет lxml (pip install lxml)')
     
-    return '\n'.join(lines)
+    try:
+        root = lxml_etree.fromstring(html.encode('utf-8'), lxml_etree.HTMLParser(encoding='utf-8'))
+    except lxml_etree.XMLSyntaxError:
+        return ''
+    if root is None:
+        return ''
+    
+    strings = []
+    walker = lxml_etree.iterwalk(root, events=('start', 'end', 'comment', 'pi'))
+    for event, element in walker:
+        if event == 'start':
+            if element.tag in SKIPPED_TEXT_TAGS:
+                walker.skip_subtree()
+            elif element.text:
+                strings.append(element.text)
+        elif element.tail:
+            # end, comment, pi: дальше идет текст после элемента
+            strings.append(element.tail)
+    
+    return _join_lines(string.strip() for string in strings if string.strip())
+
+
+# Бэкенды извлечения текста:
+# - stream: потоковый разбор без дерева, результат идентичен bs4 (по умолчанию;
+#   без приватного модуля bs4.builder._htmlparser недоступен)
+# - lxml: разбор на C через libxml2, самый быстрый, но НЕ идентичен bs4.
+#   Расхождения (libxml2 теряет это еще при разборе, из дерева не восстановить):
+#   * секции <![CDATA[...]]> выбрасываются вместе с текстом (bs4 их сохраняет)
+#   * неизвестная сущность &foo; остается как есть с ';' (bs4: '&foo'), а
+#     известная без ';' внутри слова раскрывается: &ampx -> '&x' (bs4: '&ampx')
+#   * незакрытый комментарий в конце отбрасывает хвост (bs4 оставляет его текстом)
+#   * разметка внутри <textarea> становится текстом
+#   * текст по обе стороны от проигнорированного или неявно закрытого тега
+#     склеивается в одну строку ('a</i>b' -> 'ab', bs4: 'a' и 'b' отдельно)
+# - bs4: исходная реализация на BeautifulSoup, эталон для сравнения
+EXTRACTORS = {
+    'stream': _extract_text_stream,
+    'lxml': _extract_text_lxml,
+    'bs4': _extract_text_bs4,
+}
+
+
+def available_extractors() -> list:
+    """Бэкенды, доступные в текущем окружении"""
+    unavailable = set()
+    if lxml_etree is None:
+        unavailable.add('lxml')
+    if BeautifulSoupHTMLParser is None:
+        unavailable.add('stream')
+    return [name for name in EXTRACTORS if name not in unavailable]
+
+
+def extract_text_from_html(html: str, backend: str = DEFAULT_EXTRACTOR) -> str:
+    """
+    Извлекает текстовое содержимое из HTML.
+    
+    Args:
+        html: HTML строка
+        backend: Бэкенд разбора (stream, lxml или bs4)
+        
+    Returns:
+        Извлеченный текст
+    """
+    return EXTRACTORS[backend](html)
+
+
+def create_session(pool_size: int = DEFAULT_CONCURRENCY) -> requests.Session:
+    """
+    Создает HTTP-сессию с пулом keep-alive соединений.
+    
+    Одна сессия на весь batch избавляет от TCP/TLS рукопожатия на каждый URL.
+    
+    Args:
+        pool_size: Максимум одновременно открытых соединений
+        
+    Returns:
+        Настроенная requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class _RetryableError(Exception):
+    """Временная ошибка запроса, после которой имеет смысл повторить попытку"""
+
+    def __init__(self, result: dict, throttled: bool = False, retry_after: Optional[float] = None):
+        super().__init__(result['content'])
+        self.result = result
+        self.throttled = throttled
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Разбирает заголовок Retry-After.
+    
+    Args:
+        value: Число секунд или HTTP-дата
+        
+    Returns:
+        Задержка в секундах или None если заголовок отсутствует/некорректен
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RequestScheduler:
+    """
+    Планировщик запросов к Scrape.do: адаптивный token bucket и повторы.
+    
+    - Темп запросов снижается вдвое на каждый 429 и плавно растет обратно
+      до --rate на успешных ответах (AIMD)
+    - Retry-After блокирует выдачу токенов всем потокам до указанного момента
+    - Повторы с экспоненциальной задержкой и полным джиттером,
+      не более max_retries на один URL
+    
+    Потокобезопасен: один экземпляр используется всеми потоками batch-режима.
+    """
+
+    MIN_RATE = 0.1
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        self.max_rate = max(self.MIN_RATE, rate)
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._rate = self.max_rate
+        self._burst = max(1.0, self.max_rate)
+        self._tokens = self._burst
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_refill = self._started
+
+        self._counters = {
+            'requests': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'retries': 0,
+            'throttled': 0,
+            'throttle_waits': 0,
+            'throttle_wait_seconds': 0.0,
+        }
+
+    def _count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def acquire(self) -> None:
+        """Блокирует поток, пока не появится токен на запрос"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+            # Токен резервируется сразу: долг (отрицательный баланс)
+            # выстраивает конкурирующие потоки в очередь
+            self._tokens -= 1
+            wait_for = max(0.0, self._blocked_until - now)
+            if self._tokens < 0:
+                wait_for = max(wait_for, -self._tokens / self._rate)
+            self._counters['requests'] += 1
+            if wait_for > 0:
+                self._counters['throttle_waits'] += 1
+                self._counters['throttle_wait_seconds'] += wait_for
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+    def on_success(self) -> None:
+        """Успешный ответ: аддитивно увеличивает темп до максимума"""
+        with self._lock:
+            self._counters['succeeded'] += 1
+            self._rate = min(self.max_rate, self._rate + self.max_rate * 0.05)
+
+    def on_failure(self) -> None:
+        """Окончательная неудача URL (повторы исчерпаны или ошибка не временная)"""
+        self._count('failed')
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Ответ 429: вдвое снижает темп и учитывает Retry-After"""
+        with self._lock:
+            self._counters['throttled'] += 1
+            self._rate = max(self.MIN_RATE, self._rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None, throttled: bool = False) -> None:
+        """
+        Ждет перед повторной попыткой.
+        
+        Пауза после 429 или с Retry-After — это тоже ожидание из-за
+        ограничения темпа, поэтому она учитывается в throttle_waits.
+        
+        Args:
+            attempt: Номер неудачной попытки (с нуля)
+            retry_after: Минимальная задержка из Retry-After
+            throttled: Неудача была ответом 429
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        with self._lock:
+            self._counters['retries'] += 1
+            if throttled or retry_after is not None:
+                self._counters['throttle_waits'] += 1
+                self._counters['throttle_wait_seconds'] += delay
+        time.sleep(delay)
+
+    def stats(self) -> dict:
+        """
+        Счетчики текущего прогона.
+        
+        Returns:
+            Словарь со счетчиками, текущим темпом и фактическими запросами в секунду
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            stats = dict(self._counters)
+            stats['throttle_wait_seconds'] = round(stats['throttle_wait_seconds'], 3)
+            stats['elapsed_seconds'] = round(elapsed, 3)
+            stats['requests_per_sec'] = round(stats['requests'] / elapsed, 3) if elapsed > 0 else 0.0
+            stats['current_rate'] = round(self._rate, 3)
+        return stats
+
+
+class ResponseCache:
+    """
+    Локальный кеш ответов Scrape.do на диске.
+    
+    - Ключ — SHA-256 от нормализованного URL и параметров запроса
+    - Запись — gzip-сжатый JSON с HTML, текстом и валидаторами (ETag, Last-Modified)
+    - Свежесть по TTL; устаревшие записи с валидаторами перепроверяются условным запросом
+    - Общий размер ограничен: при превышении удаляются давно не читанные записи (LRU по mtime)
+    
+    Потокобезопасен в пределах одного процесса.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024
+    ):
+        if directory is None:
+            directory = Path(__file__).parent.parent / 'cache' / 'responses'
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self._counters = {'cache_hits': 0, 'cache_misses': 0, 'cache_revalidated': 0, 'cache_evicted': 0}
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """
+        Приводит URL к каноническому виду для ключа кеша.
+        
+        Схема и хост в нижнем регистре, без порта по умолчанию и фрагмента,
+        параметры запроса отсортированы, пустой путь заменен на /.
+        """
+        try:
+            parts = urlsplit(url.strip())
+            scheme = parts.scheme.lower()
+            host = parts.hostname or ''
+            if ':' in host:
+                host = f'[{host}]'
+            port = parts.port
+        except ValueError:
+            return url.strip()
+        
+        if port and (scheme, port) not in (('http', 80), ('https', 443)):
+            host = f'{host}:{port}'
+        if parts.username:
+            userinfo = parts.username
+            if parts.password:
+                userinfo += f':{parts.password}'
+            host = f'{userinfo}@{host}'
+        
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+    def key(self, url: str, options: Optional[dict] = None) -> str:
+        """
+        Ключ кеша для URL и параметров запроса.
+        
+        Args:
+            url: URL страницы
+            options: Параметры, влияющие на сохраненный результат: опции Scrape.do
+                (без токена) и бэкенд извлечения текста
+            
+        Returns:
+            Hex SHA-256
+        """
+        material = json.dumps(
+            {'url': self.normalize_url(url), 'options': options or {}},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f'{key}.json.gz'
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Читает запись (возможно устаревшую).
+        
+        Returns:
+            Запись или None если ее нет или она повреждена
+        """
+        path = self._path(key)
+        try:
+            entry = json.loads(gzip.decompress(path.read_bytes()))
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError):
+            self._remove(path)
+            return None
+        # Обновляем mtime — по нему работает LRU-вытеснение
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Проверяет, не истек ли TTL записи"""
+        return time.time() - entry.get('fetched_at', 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        """Заголовки условного запроса по валидаторам записи"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key: str, url: str, result: dict, headers) -> None:
+        """
+        Сохраняет успешный ответ.
+        
+        Ответы с Cache-Control: no-store не кешируются.
+        
+        Args:
+            key: Ключ кеша
+            url: Исходный URL
+            result: Результат fetch_via_scrapedo
+            headers: Заголовки HTTP-ответа
+        """
+        if 'no-store' in (headers.get('Cache-Control') or '').lower():
+            return
+        entry = {
+            'url': url,
+            'fetched_at': time.time(),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'content': result['content'],
+            'html': result['html'],
+        }
+        self._write(key, entry)
+
+    def revalidate(self, key: str, entry: dict) -> None:
+        """Продлевает запись после ответа 304 Not Modified"""
+        entry['fetched_at'] = time.time()
+        self._write(key, entry)
+        self._count('cache_revalidated')
+
+    def record_hit(self) -> None:
+        self._count('cache_hits')
+
+    def record_miss(self) -> None:
+        self._count('cache_misses')
+
+    def stats(self) -> dict:
+        """Счетчики попаданий, промахов, перепроверок и вытеснений"""
+        with self._lock:
+            return dict(self._counters)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _write(self, key: str, entry: dict) -> None:
+        path = self._path(key)
+        data = gzip.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = path.stat().st_size if path.exists() else 0
+            # Атомарная запись: читатель не увидит недописанный файл
+            tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list:
+        entries = []
+        for path in self.directory.glob('*/*.json.gz'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        # Вызывается под self._lock; освобождаем место с запасом 10%,
+        # чтобы не сканировать каталог на каждой записи
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            self._remove(path)
+            self._size -= size
+            self._counters['cache_evicted'] += 1
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class _TextLineWriter:
+    """
+    Пишет текстовые узлы построчно в файл сразу по мере извлечения.
+    
+    Результат совпадает с print(extract_text_from_html(...)): строки
+    очищаются от пробелов, пустые отбрасываются.
+    """
+
+    def __init__(self, out: TextIO):
+        self.out = out
+        self.written = False
+
+    def write_string(self, string: str) -> None:
+        for line in string.splitlines():
+            line = line.strip()
+            if line:
+                self.out.write(line + '\n')
+                self.written = True
+
+    def finish(self) -> None:
+        if not self.written:
+            self.out.write('\n')
+
+
+def _read_body(
+    response: requests.Response,
+    url: str,
+    max_bytes: int,
+    extractor: str,
+    out: Optional[TextIO] = None,
+    as_html: bool = False,
+    timings: Optional[PhaseTimer] = None
+) -> dict:
+    """
+    Читает тело ответа чанками с лимитом размера и инкрементальным декодированием.
+    
+    Без out возвращает HTML и текст. С out пишет в него HTML (as_html) или
+    текст по мере загрузки и не держит страницу в памяти целиком; потоковым
+    может быть только бэкенд stream, для остальных HTML собирается в память.
+    
+    На сильно сломанной разметке (незакрытый комментарий, некорректная
+    числовая ссылка) html.parser при подаче частями может разобрать хвост
+    иначе, чем целиком, поэтому без out текст извлекается из всей страницы.
+    
+    Raises:
+        requests.exceptions.RequestException: Обрыв до того, как что-либо записано в out
+    """
+    encoding = response.encoding or 'utf-8'
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    
+    html_to_out = out is not None and as_html
+    text_writer = _TextLineWriter(out) if out is not None and not as_html else None
+    text_extractor = None
+    if text_writer is not None and extractor == 'stream':
+        text_extractor = StreamingTextExtractor(text_writer.write_string)
+    html_parts = None if html_to_out or text_extractor is not None else []
+    
+    # Запись и разбор идут внутри цикла загрузки: их время вычитается из network
+    spent = {'parse': 0.0, 'save': 0.0}
+    
+    def consume(piece: str) -> None:
+        if not piece:
+            return
+        if html_to_out:
+            started = time.perf_counter()
+            out.write(piece)
+            spent['save'] += time.perf_counter() - started
+        if text_extractor is not None:
+            started = time.perf_counter()
+            text_extractor.feed(piece)
+            spent['parse'] += time.perf_counter() - started
+        if html_parts is not None:
+            html_parts.append(piece)
+    
+    received = 0
+    download_started = time.perf_counter()
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            received += len(chunk)
+            if max_bytes and received > max_bytes:
+                return {
+                    'success': False,
+                    'content': f'Ошибка: Ответ для {url} превышает лимит {max_bytes} байт'
+                }
+            consume(decoder.decode(chunk))
+        consume(decoder.decode(b'', final=True))
+    except requests.exceptions.RequestException as e:
+        # Повтор после частичной записи в out продублировал бы вывод
+        if out is not None and received:
+            return {
+                'success': False,
+                'content': f'Ошибка: Загрузка {url} прервана: {str(e)}'
+            }
+        raise
+    finally:
+        if timings is not None:
+            elapsed = time.perf_counter() - download_started
+            timings.add('network', elapsed - spent['parse'] - spent['save'])
+            for name, seconds in spent.items():
+                if seconds:
+                    timings.add(name, seconds)
+    
+    if text_extractor is not None:
+        with _phase(timings, 'parse'):
+            text_extractor.close()
+    
+    if out is not None:
+        if text_writer is not None:
+            if text_extractor is None:
+                with _phase(timings, 'parse'):
+                    text = extract_text_from_html(''.join(html_parts), extractor)
+                with _phase(timings, 'save'):
+                    text_writer.write_string(text)
+            text_writer.finish()
+        return {'success': True, 'content': ''}
+    
+    html_content = ''.join(html_parts)
+    with _phase(timings, 'parse'):
+        text_content = extract_text_from_html(html_content, extractor)
+    return {
+        'success': True,
+        'content': text_content,
+        'html': html_content
+    }
+
+
+def _request_scrapedo(
+    url: str,
+    params: dict,
+    http,
+    extra_headers: Optional[dict] = None,
+    extractor: str = DEFAULT_EXTRACTOR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    out: Optional[TextIO] = None,
+    as_html: bool = False,
+    timings: Optional[PhaseTimer] = None
+) -> Tuple[dict, Optional[requests.Response]]:
+    """
+    Выполняет одну попытку запроса к Scrape.do API.
+    
+    Returns:
+        Пара (результат, HTTP-ответ или None при сетевой ошибке)
+    
+    Raises:
+        _RetryableError: 429, 5xx, таймаут или ошибка соединения
+    """
+    headers = {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9',
+        'Accept-Encoding': 'gzip, deflate',
+    }
+    if extra_headers:
+        headers.update(extra_headers)
+    
+    try:
+        # Делаем запрос; тело читается потоково с лимитом размера
+        with _phase(timings, 'network'):
+            response = http.get(
+                SCRAPEDO_API,
+                params=params,
+                timeout=30,
+                headers=headers,
+                stream=True
+            )
+        
+        with response:
+            # Обрабатываем ошибки API
+            if response.status_code == 401:
+                return {
+                    'success': False,
+                    'content': 'Ошибка: Неверный токен Scrape.do или сервис заблокирован'
+                }, response
+            
+            # Страница не изменилась с момента кеширования (условный запрос)
+            if response.status_code == 304:
+                return {'success': True, 'content': '', 'html': ''}, response
+            
+            if response.status_code == 429:
+                raise _RetryableError(
+                    {
+                        'success': False,
+                        'content': 'Ошибка: Превышен лимит запросов Scrape.do'
+                    },
+                    throttled=True,
+                    retry_after=parse_retry_after(response.headers.get('Retry-After'))
+                )
+            
+            if response.status_code >= 500:
+                raise _RetryableError({
+                    'success': False,
+                    'content': f'Ошибка при запросе: HTTP {response.status_code} для {url}'
+                })
+            
+            # Проверяем статус
+            response.raise_for_status()
+            
+            # Извлекаем HTML и текст
+            return _read_body(response, url, max_bytes, extractor, out, as_html, timings), response
+        
+    except _RetryableError:
+        raise
+    except requests.exceptions.Timeout:
+        raise _RetryableError({
+            'success': False,
+            'content': f'Ошибка: Таймаут при запросе к {url}'
+        })
+    except requests.exceptions.ConnectionError as e:
+        raise _RetryableError({
+            'success': False,
+            'content': f'Ошибка при запросе: {str(e)}'
+        })
+    except requests.exceptions.RequestException as e:
+        return {
+            'success': False,
+            'content': f'Ошибка при запросе: {str(e)}'
+        }, None
+    except Exception as e:
+        return {
+            'success': False,
+            'content': f'Неожиданная ошибка: {str(e)}'
+        }, None
+
+
+def _missing_token_result() -> dict:
+    script_dir = Path(__file__).parent.parent
+    return {
+        'success': False,
+        'content': f'Ошибка: Не найден токен Scrape.do. Создайте файл {script_dir}/config/token.txt с вашим токеном или установите переменную окружения SCRAPEDO_TOKEN'
+    }
+
+
+def _request_with_retries(
+    url: str,
+    params: dict,
+    http,
+    scheduler: Optional[RequestScheduler],
+    **request_options
+) -> Tuple[dict, Optional[requests.Response]]:
+    """
+    Выполняет запрос с учетом темпа и бюджета повторов планировщика.
+    
+    Без планировщика делается одна попытка.
+    """
+    timings = request_options.get('timings')
+    attempt = 0
+    while True:
+        if scheduler is not None:
+            with _phase(timings, 'wait'):
+                scheduler.acquire()
+        try:
+            result, response = _request_scrapedo(url, params, http, **request_options)
+        except _RetryableError as e:
+            if scheduler is None:
+                return e.result, None
+            if e.throttled:
+                scheduler.on_throttle(e.retry_after)
+            if attempt >= scheduler.max_retries:
+                scheduler.on_failure()
+                return e.result, None
+            with _phase(timings, 'wait'):
+                scheduler.backoff(attempt, e.retry_after, e.throttled)
+            attempt += 1
+            continue
+        
+        if scheduler is not None:
+            if result['success']:
+                scheduler.on_success()
+            else:
+                scheduler.on_failure()
+        return result, response
 
 
-def fetch_via_scrapedo(url: str, token: Optional[str] = None) -> dict:
+def fetch_via_scrapedo(
+    url: str,
+    token: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+    scheduler: Optional[RequestScheduler] = None,
+    cache: Optional[ResponseCache] = None,
+    refresh: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    timings: Optional[PhaseTimer] = None
+) -> dict:
     """
     Делает запрос к Scrape.do API для скрапинга сайта.
     
     Args:
         url: URL для скрапинга
         token: Токен Scrape.do (если не передан, берется автоматически)
+        session: HTTP-сессия для переиспользования соединений (опционально)
+        scheduler: Планировщик темпа и повторов (без него — одна попытка)
+        cache: Локальный кеш ответов (без него — всегда запрос к API)
+        refresh: Игнорировать закешированный ответ и перезаписать его
+        extractor: Бэкенд извлечения текста (см. EXTRACTORS)
+        max_bytes: Предельный размер ответа в байтах (0 — без лимита)
+        timings: Таймер фаз для --timings (опционально)
         
     Returns:
         Словарь с результатом:
@@ -98,79 +1064,279 @@ def fetch_via_scrapedo(url: str, token: Optional[str] = None) -> dict:
         - content: str - извлеченный контент или ошибка
         - html: str - оригинальный HTML (если успешно)
     """
+    # Свежий ответ из кеша возвращается без сети и без расхода кредитов
+    cache_key = None
+    cached = None
+    if cache is not None:
+        # В кеше лежит уже извлеченный текст, поэтому бэкенд входит в ключ
+        cache_key = cache.key(url, {'extractor': extractor})
+        if not refresh:
+            with _phase(timings, 'cache'):
+                cached = cache.get(cache_key)
+            if cached is not None and cache.is_fresh(cached):
+                cache.record_hit()
+                return {'success': True, 'content': cached['content'], 'html': cached['html']}
+        cache.record_miss()
+    
     # Получаем токен
     if token is None:
-        token = get_token()
+        with _phase(timings, 'token'):
+            token = get_token()
     
     if not token:
-        script_dir = Path(__file__).parent.parent
-        return {
-            'success': False,
-            'content': f'Ошибка: Не найден токен Scrape.do. Создайте файл {script_dir}/config/token.txt с вашим токеном или установите переменную окружения SCRAPEDO_TOKEN'
-        }
+        return _missing_token_result()
     
     # Формируем запрос (requests сам кодирует параметры)
-    base_api = 'http://api.scrape.do'
     params = {
         'token': token,
         'url': url
     }
+    http = session if session is not None else requests
     
-    try:
-        # Делаем запрос
-        response = requests.get(
-            base_api,
-            params=params,
-            timeout=30,
-            headers={
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9',
-                'Accept-Encoding': 'gzip, deflate',
-            }
-        )
+    # Устаревшая запись с валидаторами — просим сайт ответить 304, если
+    # страница не менялась (customHeaders пробрасывает заголовки до сайта)
+    conditional_headers = cache.conditional_headers(cached) if cached is not None else {}
+    if conditional_headers:
+        params['customHeaders'] = 'true'
+    
+    result, response = _request_with_retries(
+        url, params, http, scheduler,
+        extra_headers=conditional_headers, extractor=extractor, max_bytes=max_bytes,
+        timings=timings
+    )
+    
+    if cache is not None and result['success'] and response is not None:
+        with _phase(timings, 'cache'):
+            if response.status_code == 304:
+                if cached is not None:
+                    cache.revalidate(cache_key, cached)
+                    return {'success': True, 'content': cached['content'], 'html': cached['html']}
+            else:
+                cache.put(cache_key, url, result, response.headers)
+    return result
+
+
+def stream_via_scrapedo(
+    url: str,
+    out: TextIO,
+    as_html: bool = False,
+    token: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+    scheduler: Optional[RequestScheduler] = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    extractor: str = DEFAULT_EXTRACTOR,
+    timings: Optional[PhaseTimer] = None
+) -> dict:
+    """
+    Скрапит страницу и пишет HTML или текст прямо в out по мере загрузки.
+    
+    Кеш не используется. С бэкендом stream в памяти не держится ни полный HTML,
+    ни обе копии сразу; для lxml и bs4 текст извлекается после загрузки всей
+    страницы. Если загрузка оборвалась после начала записи, в out остается
+    частичный результат, а повтор не делается.
+    
+    Args:
+        url: URL для скрапинга
+        out: Куда писать результат (stdout или открытый файл)
+        as_html: Писать HTML вместо извлеченного текста
+        token: Токен Scrape.do (если не передан, берется автоматически)
+        session: HTTP-сессия для переиспользования соединений (опционально)
+        scheduler: Планировщик темпа и повторов (без него — одна попытка)
+        max_bytes: Предельный размер ответа в байтах (0 — без лимита)
+        extractor: Бэкенд извлечения текста (см. EXTRACTORS)
+        timings: Таймер фаз для --timings (опционально)
         
-        # Обрабатываем ошибки API
-        if response.status_code == 401:
-            return {
-                'success': False,
-                'content': 'Ошибка: Неверный токен Scrape.do или сервис заблокирован'
-            }
+    Returns:
+        Словарь с результатом:
+        - success: bool - успешность операции
+        - content: str - пустая строка или описание ошибки
+    """
+    if token is None:
+        with _phase(timings, 'token'):
+            token = get_token()
+    
+    if not token:
+        return _missing_token_result()
+    
+    params = {
+        'token': token,
+        'url': url
+    }
+    http = session if session is not None else requests
+    
+    result, _ = _request_with_retries(
+        url, params, http, scheduler,
+        extractor=extractor, max_bytes=max_bytes, out=out, as_html=as_html, timings=timings
+    )
+    return result
+
+
+def read_urls(source: TextIO) -> Iterator[str]:
+    """
+    Читает список URL: по одному на строку.
+    
+    Пустые строки и строки, начинающиеся с #, пропускаются.
+    
+    Args:
+        source: Файл или stdin
         
-        if response.status_code == 429:
-            return {
-                'success': False,
-                'content': 'Ошибка: Превышен лимит запросов Scrape.do'
-            }
+    Yields:
+        URL
+    """
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def scrape_batch(
+    urls: Iterable[str],
+    token: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    scheduler: Optional[RequestScheduler] = None,
+    cache: Optional[ResponseCache] = None,
+    refresh: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    timings: Optional[PhaseTimer] = None
+) -> Iterator[Tuple[str, dict]]:
+    """
+    Параллельно скрапит список URL через общий пул соединений.
+    
+    Args:
+        urls: URL для скрапинга (может быть ленивым итератором)
+        token: Токен Scrape.do (если не передан, берется автоматически)
+        concurrency: Максимум одновременных запросов
+        scheduler: Планировщик темпа и повторов (по умолчанию создается новый)
+        cache: Локальный кеш ответов (опционально)
+        refresh: Игнорировать закешированные ответы
+        extractor: Бэкенд извлечения текста
+        max_bytes: Предельный размер ответа в байтах (0 — без лимита)
+        timings: Таймер фаз для --timings (опционально)
         
-        # Проверяем статус
-        response.raise_for_status()
+    Yields:
+        Пары (url, результат fetch_via_scrapedo) в порядке завершения
+    """
+    if token is None:
+        with _phase(timings, 'token'):
+            token = get_token()
+    
+    if scheduler is None:
+        scheduler = RequestScheduler()
+    
+    concurrency = max(1, concurrency)
+    urls = iter(urls)
+    
+    with create_session(concurrency) as session, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
         
-        # Извлекаем HTML
-        html_content = response.text
+        def submit_next() -> bool:
+            url = next(urls, None)
+            if url is None:
+                return False
+            future = executor.submit(
+                fetch_via_scrapedo, url, token, session, scheduler, cache, refresh,
+                extractor, max_bytes, timings
+            )
+            pending[future] = url
+            return True
         
-        # Извлекаем текст
-        text_content = extract_text_from_html(html_content)
+        # Держим в очереди ограниченное число задач, чтобы не читать
+        # весь список URL в память заранее
+        for _ in range(concurrency * 2):
+            if not submit_next():
+                break
         
-        return {
-            'success': True,
-            'content': text_content,
-            'html': html_content
-        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = pending.pop(future)
+                yield url, future.result()
+                submit_next()
+
+
+def run_batch(
+    source: TextIO,
+    token: Optional[str],
+    concurrency: int,
+    scheduler: RequestScheduler,
+    cache: Optional[ResponseCache] = None,
+    refresh: bool = False,
+    extractor: str = DEFAULT_EXTRACTOR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    timings: Optional[PhaseTimer] = None
+) -> bool:
+    """
+    Выполняет batch-скрапинг и пишет результаты в stdout в формате JSONL.
+    
+    Args:
+        source: Файл или stdin со списком URL
+        token: Токен Scrape.do
+        concurrency: Максимум одновременных запросов
+        scheduler: Планировщик темпа и повторов
+        cache: Локальный кеш ответов (опционально)
+        refresh: Игнорировать закешированные ответы
+        extractor: Бэкенд извлечения текста
+        max_bytes: Предельный размер ответа в байтах (0 — без лимита)
+        timings: Таймер фаз для --timings (опционально)
         
-    except requests.exceptions.Timeout:
-        return {
-            'success': False,
-            'content': f'Ошибка: Таймаут при запросе к {url}'
-        }
-    except requests.exceptions.RequestException as e:
-        return {
-            'success': False,
-            'content': f'Ошибка при запросе: {str(e)}'
-        }
-    except Exception as e:
-        return {
-            'success': False,
-            'content': f'Неожиданная ошибка: {str(e)}'
-        }
+    Returns:
+        True если все URL скрапнуты успешно
+    """
+    all_ok = True
+    for url, result in scrape_batch(
+        read_urls(source), token, concurrency, scheduler, cache, refresh, extractor, max_bytes,
+        timings
+    ):
+        all_ok = all_ok and result['success']
+        record = {'url': url, **result}
+        with _phase(timings, 'save'):
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+    return all_ok
+
+
+def run_stream(
+    url: str,
+    output: Optional[str],
+    as_html: bool,
+    token: Optional[str],
+    scheduler: RequestScheduler,
+    max_bytes: int,
+    extractor: str = DEFAULT_EXTRACTOR,
+    timings: Optional[PhaseTimer] = None
+) -> dict:
+    """
+    Потоковый скрапинг одного URL в stdout или файл.
+    
+    Файл пишется во временный рядом и переименовывается только при успехе,
+    поэтому оборванная загрузка не оставляет частичный результат.
+    
+    Returns:
+        Результат stream_via_scrapedo
+    """
+    if not output:
+        return stream_via_scrapedo(
+            url, sys.stdout, as_html, token, scheduler=scheduler, max_bytes=max_bytes,
+            extractor=extractor, timings=timings
+        )
+    
+    target = Path(output)
+    tmp = target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf-8') as out:
+            result = stream_via_scrapedo(
+                url, out, as_html, token, scheduler=scheduler, max_bytes=max_bytes,
+                extractor=extractor, timings=timings
+            )
+        if result['success']:
+            with _phase(timings, 'save'):
+                os.replace(tmp, target)
+        return result
+    finally:
+        if tmp.exists():
+            tmp.unlink()
 
 
 def main():
@@ -178,7 +1344,7 @@ def main():
     parser = argparse.ArgumentParser(
         description='Скрапинг веб-страниц через Scrape.do API'
     )
-    parser.add_argument('url', help='URL для скрапинга')
+    parser.add_argument('url', nargs='?', help='URL для скрапинга')
     parser.add_argument(
         '--html',
         action='store_true',
@@ -188,21 +1354,162 @@ def main():
         '--token',
         help='Токен Scrape.do (по умолчанию из GLOBAL_SYSTEM_SCRAPEDO_TOKEN)'
     )
+    parser.add_argument(
+        '--batch',
+        metavar='FILE',
+        help='Файл со списком URL (по одному на строку, - для stdin); '
+             'результаты выводятся в JSONL'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f'Число одновременных запросов в batch-режиме (по умолчанию {DEFAULT_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=DEFAULT_RATE,
+        help=f'Максимум запросов в секунду; снижается автоматически при 429 (по умолчанию {DEFAULT_RATE:g})'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f'Повторов на URL при 429/5xx/таймауте (по умолчанию {DEFAULT_MAX_RETRIES})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Не использовать локальный кеш ответов'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Скачать заново, игнорируя кеш, и обновить запись'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        help=f'Время жизни записи кеша в секундах (по умолчанию {DEFAULT_CACHE_TTL})'
+    )
+    parser.add_argument(
+        '--cache-max-mb',
+        type=int,
+        help=f'Предельный размер кеша на диске в МБ (по умолчанию {DEFAULT_CACHE_MAX_MB})'
+    )
+    parser.add_argument(
+        '--extractor',
+        choices=list(EXTRACTORS),
+        default=DEFAULT_EXTRACTOR,
+        help=f'Бэкенд извлечения текста (по умолчанию {DEFAULT_EXTRACTOR}; lxml быстрее, требует pip install lxml)'
+    )
+    parser.add_argument(
+        '--max-bytes',
+        type=int,
+        default=DEFAULT_MAX_BYTES,
+        help=f'Предельный размер ответа в байтах, 0 — без лимита (по умолчанию {DEFAULT_MAX_BYTES})'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Писать результат по мере загрузки, не держа страницу в памяти (без кеша, только для одного URL)'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        metavar='FILE',
+        help='Записать результат в файл вместо stdout'
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Вывести в stderr JSON со счетчиками прогона (повторы, ожидания, запросов/сек)'
+    )
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help='Вывести в stderr JSON с разбивкой времени по фазам (token, cache, wait, network, parse, save)'
+    )
     
     args = parser.parse_args()
+    timings = PhaseTimer() if args.timings else None
+    
+    if args.extractor not in available_extractors():
+        if args.extractor == 'stream':
+            parser.error('бэкенд stream недоступен в этой версии bs4, используйте --extractor bs4')
+        parser.error(f'бэкенд {args.extractor} недоступен: установите пакет {args.extractor}')
+    
+    if args.stream and (args.refresh or args.cache_ttl is not None or args.cache_max_mb is not None):
+        parser.error('--stream не использует кеш: --refresh, --cache-ttl и --cache-max-mb с ним несовместимы')
+    if args.cache_ttl is None:
+        args.cache_ttl = DEFAULT_CACHE_TTL
+    if args.cache_max_mb is None:
+        args.cache_max_mb = DEFAULT_CACHE_MAX_MB
+    
+    scheduler = RequestScheduler(rate=args.rate, max_retries=args.retries)
+    cache = None
+    if not args.no_cache and not args.stream:
+        cache = ResponseCache(ttl=args.cache_ttl, max_bytes=args.cache_max_mb * 1024 * 1024)
+    
+    def print_stats():
+        if args.stats:
+            stats = scheduler.stats()
+            if cache is not None:
+                stats.update(cache.stats())
+            print(json.dumps(stats), file=sys.stderr)
+        if timings is not None:
+            print(json.dumps({'timings': timings.report()}), file=sys.stderr)
+    
+    if args.batch:
+        if args.stream or args.output:
+            parser.error('--stream и --output не поддерживаются в batch-режиме')
+        options = dict(
+            token=args.token, concurrency=args.concurrency, scheduler=scheduler, cache=cache,
+            refresh=args.refresh, extractor=args.extractor, max_bytes=args.max_bytes,
+            timings=timings
+        )
+        if args.batch == '-':
+            ok = run_batch(sys.stdin, **options)
+        else:
+            with open(args.batch, encoding='utf-8') as source:
+                ok = run_batch(source, **options)
+        print_stats()
+        sys.exit(0 if ok else 1)
+    
+    if not args.url:
+        parser.error('укажите URL или --batch FILE')
+    
+    if args.stream:
+        result = run_stream(
+            args.url, args.output, args.html, args.token, scheduler, args.max_bytes,
+            args.extractor, timings
+        )
+        print_stats()
+        if not result['success']:
+            print(result['content'], file=sys.stderr)
+            sys.exit(1)
+        return
     
     # Выполняем скрапинг
-    result = fetch_via_scrapedo(args.url, args.token)
+    result = fetch_via_scrapedo(
+        args.url, args.token, scheduler=scheduler, cache=cache, refresh=args.refresh,
+        extractor=args.extractor, max_bytes=args.max_bytes, timings=timings
+    )
     
     if not result['success']:
+        print_stats()
         print(result['content'], file=sys.stderr)
         sys.exit(1)
     
     # Выводим результат
-    if args.html and 'html' in result:
-        print(result['html'])
-    else:
-        print(result['content'])
+    output = result['html'] if args.html and 'html' in result else result['content']
+    with _phase(timings, 'save'):
+        if args.output:
+            Path(args.output).write_text(output + '\n', encoding='utf-8')
+        else:
+            print(output)
+    
+    print_stats()
 
 
 if __name__ == '__main__':
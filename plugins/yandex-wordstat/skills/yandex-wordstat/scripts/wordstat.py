@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""Yandex Wordstat API client.
+
+Fetches topRequests, dynamics and regions for many phrases concurrently
+while staying within the API limits (10 requests/second, 1000 requests/day).
+Responses are cached in cache/responses/ by method and parameters, so
+repeated research over the same semantic core costs no quota.
+
+Usage:
+    python3 scripts/wordstat.py top --phrase "юрист дтп" --regions 213
+    python3 scripts/wordstat.py batch --phrases-file phrases.txt \\
+        --methods top,dynamics,regions --regions 213 --output results.jsonl
+
+Only the standard library is used.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SKILL_DIR = Path(__file__).resolve().parent.parent
+CONFIG_FILE = SKILL_DIR / "config" / ".env"
+CACHE_DIR = SKILL_DIR / "cache"
+API_URL = "https://api.wordstat.yandex.net/v1/"
+
+METHODS = {"top": "topRequests", "dynamics": "dynamics", "regions": "regions"}
+
+DEFAULT_RPS = 10.0
+DEFAULT_DAILY_LIMIT = 1000
+DEFAULT_WORKERS = 10
+DEFAULT_CACHE_TTL = 24 * 3600
+DEFAULT_RETRIES = 4
+DEFAULT_TIMEOUT = 60
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class WordstatError(Exception):
+    """API or transport error for a single request."""
+
+
+class QuotaExceeded(WordstatError):
+    """The local daily request budget is used up."""
+
+
+def load_token():
+    """Token from YANDEX_WORDSTAT_TOKEN or config/.env (same rules as common.sh)."""
+    token = os.environ.get("YANDEX_WORDSTAT_TOKEN")
+    if token:
+        return token.strip()
+    if CONFIG_FILE.exists():
+        for line in CONFIG_FILE.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            if key.strip() == "YANDEX_WORDSTAT_TOKEN":
+                return value.strip().strip('"').strip("'")
+    raise WordstatError(
+        "YANDEX_WORDSTAT_TOKEN not found. "
+        "Set in config/.env or environment. See config/README.md for instructions."
+    )
+
+
+class RateLimiter:
+    """Spaces requests to at most `rps` per second across threads."""
+
+    def __init__(self, rps=DEFAULT_RPS):
+        self.interval = 1.0 / rps
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        """Push every following request back, e.g. after a 429."""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock across processes via flock on a side file (no-op without fcntl)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DailyQuota:
+    """Counts requests per calendar day in cache/usage.json and enforces a limit.
+
+    The counter is shared by all runs on this machine: reserve() holds a file
+    lock (usage.json.lock) around its read-modify-write, so parallel batches
+    in one day do not overrun the API quota together. Without fcntl
+    (Windows) only threads of one process are serialized.
+    """
+
+    def __init__(self, path=CACHE_DIR / "usage.json", limit=DEFAULT_DAILY_LIMIT):
+        self.path = Path(path)
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._lock_path = self.path.with_name(self.path.name + ".lock")
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0
+        return data.get("count", 0) if data.get("date") == date.today().isoformat() else 0
+
+    def used(self):
+        with self._lock:
+            return self._load()
+
+    def reserve(self):
+        with self._lock, _file_lock(self._lock_path):
+            count = self._load()
+            if count >= self.limit:
+                raise QuotaExceeded(f"daily request limit reached ({count}/{self.limit})")
+            _write_json(self.path, {"date": date.today().isoformat(), "count": count + 1})
+
+
+class ResponseCache:
+    """TTL cache of API responses keyed by method and normalized parameters."""
+
+    def __init__(self, directory=CACHE_DIR / "responses", ttl=DEFAULT_CACHE_TTL):
+        self.directory = Path(directory)
+        self.ttl = ttl
+
+    @staticmethod
+    def key(method, params):
+        raw = json.dumps({"method": method, "params": params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, method, params):
+        path = self.directory / f"{self.key(method, params)}.json"
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created", 0) > self.ttl:
+            return None
+        return entry.get("response")
+
+    def put(self, method, params, response):
+        path = self.directory / f"{self.key(method, params)}.json"
+        _write_json(path, {
+            "created": time.time(),
+            "method": method,
+            "params": params,
+            "response": response,
+        })
+
+
+def _write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _retry_after(headers):
+    try:
+        return max(0.0, float(headers.get("Retry-After", "")))
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_message(payload):
+    error = payload.get("error") if isinstance(payload, dict) else None
+    if isinstance(error, dict):
+        parts = [str(error.get(k)) for k in ("error_code", "error_string", "error_detail", "message")
+                 if error.get(k)]
+        return " ".join(parts) or json.dumps(error, ensure_ascii=False)
+    return str(error)
+
+
+class WordstatClient:
+    """Wordstat API client with rate limiting, daily quota, retries and a response cache.
+
+    Thread-safe: fetch_many() shares one client between worker threads.
+    """
+
+    def __init__(self, token=None, rps=DEFAULT_RPS, cache=None, quota=None,
+                 retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+        self.token = token or load_token()
+        self.limiter = RateLimiter(rps)
+        self.cache = cache
+        self.quota = quota if quota is not None else DailyQuota()
+        self.retries = retries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _post(self, method, params):
+        body = json.dumps(params, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(API_URL + method, data=body, method="POST", headers={
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json; charset=utf-8",
+        })
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def request(self, method, params, use_cache=True):
+        """POST one API method; retries throttling and transient errors with backoff."""
+        if use_cache and self.cache is not None:
+            cached = self.cache.get(method, params)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+
+        for attempt in range(self.retries + 1):
+            self.quota.reserve()
+            self.limiter.acquire()
+            self._count("requests")
+            delay = None
+            try:
+                payload = self._post(method, params)
+            except urllib.error.HTTPError as e:
+                try:
+                    payload = json.loads(e.read().decode("utf-8"))
+                except ValueError:
+                    payload = {"error": f"HTTP {e.code}"}
+                if e.code not in RETRYABLE_STATUS or attempt == self.retries:
+                    self._count("errors")
+                    raise WordstatError(f"HTTP {e.code}: {_error_message(payload)}") from None
+                delay = _retry_after(e.headers)
+                if e.code == 429:
+                    self.limiter.pause(delay or 1.0)
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                if attempt == self.retries:
+                    self._count("errors")
+                    raise WordstatError(f"network error: {e}") from None
+            except ValueError:
+                self._count("errors")
+                raise WordstatError("invalid JSON in response") from None
+            else:
+                if isinstance(payload, dict) and "error" in payload:
+                    self._count("errors")
+                    raise WordstatError(_error_message(payload))
+                if use_cache and self.cache is not None:
+                    self.cache.put(method, params, payload)
+                return payload
+
+            self._count("retries")
+            if delay is None:
+                delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+            time.sleep(delay)
+
+    def top_requests(self, phrase, regions=None, devices=None, use_cache=True):
+        return self.request("topRequests", build_params("top", phrase, regions=regions, devices=devices),
+                            use_cache)
+
+    def dynamics(self, phrase, period="monthly", from_date=None, to_date=None, regions=None,
+                 devices=None, use_cache=True):
+        params = build_params("dynamics", phrase, period=period, from_date=from_date,
+                              to_date=to_date, regions=regions, devices=devices)
+        return self.request("dynamics", params, use_cache)
+
+    def regions(self, phrase, region_type="all", devices=None, use_cache=True):
+        params = build_params("regions", phrase, region_type=region_type, devices=devices)
+        return self.request("regions", params, use_cache)
+
+    def fetch_many(self, phrases, methods=("top",), workers=DEFAULT_WORKERS, use_cache=True,
+                   on_result=None, **options):
+        """Fetch several methods for many phrases concurrently.
+
+        Args:
+            phrases: Phrases (duplicates are fetched once)
+            methods: Short method names from METHODS
+            workers: Concurrent requests; the rate limiter still caps requests/second
+            use_cache: Read and write the response cache
+            on_result: Optional callback(phrase, method, result) called as results arrive
+            **options: regions, devices, period, from_date, to_date, region_type
+
+        Returns:
+            {phrase: {method: response or {"error": message}}}
+        """
+        phrases = list(dict.fromkeys(p.strip() for p in phrases if p.strip()))
+        jobs = [(phrase, method) for phrase in phrases for method in methods]
+        results = {phrase: {} for phrase in phrases}
+        exhausted = threading.Event()
+
+        def run(job):
+            phrase, method = job
+            if exhausted.is_set():
+                result = {"error": "skipped: daily request limit reached"}
+            else:
+                params = build_params(method, phrase, **_options_for(method, options))
+                try:
+                    result = self.request(METHODS[method], params, use_cache)
+                except QuotaExceeded as e:
+                    exhausted.set()
+                    result = {"error": str(e)}
+                except WordstatError as e:
+                    result = {"error": str(e)}
+            if on_result is not None:
+                on_result(phrase, method, result)
+            return phrase, method, result
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for phrase, method, result in pool.map(run, jobs):
+                results[phrase][method] = result
+        return results
+
+
+def _options_for(method, options):
+    allowed = {
+        "top": ("regions", "devices"),
+        "dynamics": ("period", "from_date", "to_date", "regions", "devices"),
+        "regions": ("region_type", "devices"),
+    }[method]
+    return {k: v for k, v in options.items() if k in allowed and v is not None}
+
+
+def build_params(method, phrase, regions=None, devices=None, period="monthly", from_date=None,
+                 to_date=None, region_type="all"):
+    """Request body for a short method name; normalized so equal requests share a cache key."""
+    params = {"phrase": " ".join(phrase.split())}
+    if method == "dynamics":
+        params["period"] = period
+        params["fromDate"] = from_date or (date.today() - timedelta(days=365)).isoformat()
+        if to_date:
+            params["toDate"] = to_date
+    if method in ("top", "dynamics") and regions:
+        params["regions"] = sorted({int(r) for r in regions})
+    if method == "regions" and region_type and region_type != "all":
+        params["regionType"] = region_type
+    if devices and devices != "all":
+        params["devices"] = [devices] if isinstance(devices, str) else sorted(devices)
+    return params
+
+
+def _parse_regions(value):
+    return [int(r) for r in value.split(",") if r.strip()] if value else None
+
+
+def read_phrases(path):
+    """Phrases from a file (one per line, # comments) or stdin for "-"."""
+    handle = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        return [line.strip() for line in handle if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yandex Wordstat API client")
+    parser.add_argument("command", choices=["top", "dynamics", "regions", "batch", "usage"])
+    parser.add_argument("--phrase", "-p", action="append", default=[], help="search phrase (repeatable)")
+    parser.add_argument("--phrases-file", help="file with one phrase per line, - for stdin")
+    parser.add_argument("--methods", default="top", help="batch: comma-separated top,dynamics,regions")
+    parser.add_argument("--regions", "-r", help="region IDs, comma-separated")
+    parser.add_argument("--devices", "-d", default="all", help="all, desktop, phone, tablet")
+    parser.add_argument("--period", default="monthly", help="dynamics: daily, weekly, monthly")
+    parser.add_argument("--from-date", help="dynamics: YYYY-MM-DD (default: 1 year ago)")
+    parser.add_argument("--to-date", help="dynamics: YYYY-MM-DD")
+    parser.add_argument("--region-type", default="all", help="regions: cities, regions, all")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent requests")
+    parser.add_argument("--rps", type=float, default=DEFAULT_RPS, help="requests per second")
+    parser.add_argument("--daily-limit", type=int, default=DEFAULT_DAILY_LIMIT, help="requests per day")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL, help="cache TTL, seconds")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the cache")
+    parser.add_argument("--output", "-o", help="write JSON Lines here instead of stdout")
+    args = parser.parse_args()
+
+    quota = DailyQuota(limit=args.daily_limit)
+    if args.command == "usage":
+        print(json.dumps({"date": date.today().isoformat(), "used": quota.used(),
+                          "limit": args.daily_limit}))
+        return
+
+    phrases = list(args.phrase)
+    if args.phrases_file:
+        phrases.extend(read_phrases(args.phrases_file))
+    if not phrases:
+        parser.error("give --phrase or --phrases-file")
+
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()] if args.command == "batch" \
+        else [args.command]
+    for method in methods:
+        if method not in METHODS:
+            parser.error(f"unknown method {method}; use {', '.join(METHODS)}")
+
+    try:
+        client = WordstatClient(
+            rps=args.rps,
+            cache=None if args.no_cache else ResponseCache(ttl=args.cache_ttl),
+            quota=quota,
+        )
+    except WordstatError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    lock = threading.Lock()
+
+    def write(phrase, method, result):
+        with lock:
+            out.write(json.dumps({"phrase": phrase, "method": method, "result": result},
+                                 ensure_ascii=False) + "\n")
+            out.flush()
+
+    try:
+        results = client.fetch_many(
+            phrases, methods, workers=args.workers, use_cache=not args.no_cache, on_result=write,
+            regions=_parse_regions(args.regions), devices=args.devices, period=args.period,
+            from_date=args.from_date, to_date=args.to_date, region_type=args.region_type,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    failed = sum("error" in r for by_method in results.values() for r in by_method.values())
+    print(f"Done: {len(results)} phrases, {client.stats['requests']} requests, "
+          f"{client.stats['cache_hits']} from cache, {failed} failed, "
+          f"quota used today {quota.used()}/{args.daily_limit}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()